@@ -0,0 +1,47 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 9:30 AM
+els.obrq@gmail.com
+
+ref: Dormand, J. R. and Prince, P. J. A family of embedded Runge-Kutta formulae
+"""
+import numpy as np
+
+# Butcher tableau of the Dormand-Prince 5(4) pair
+DP_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1])
+DP_A = [[],
+        [1 / 5],
+        [3 / 40, 9 / 40],
+        [44 / 45, -56 / 15, 32 / 9],
+        [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+        [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+        [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84]]
+DP_B5 = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0])
+DP_B4 = np.array([5179 / 57600, 0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40])
+
+
+def dormand_prince_step(rhs, state, dt):
+    """
+    One step of the Dormand-Prince 5(4) pair for an autonomous right hand side.
+
+    :param rhs: function of the state that returns its derivative
+    :param state: initial state
+    :param dt: step width
+    :return: state of 5th order and the difference with the embedded 4th order solution (error estimate)
+    """
+    x = np.array(state, dtype=float)
+    k = np.zeros((7, len(x)))
+    k[0] = rhs(x)
+    for i in range(1, 7):
+        k[i] = rhs(x + dt * np.dot(DP_A[i], k[:i]))
+    next_x = x + dt * np.dot(DP_B5, k)
+    error = dt * np.dot(DP_B5 - DP_B4, k)
+    return next_x, error
+
+
+def calc_error_norm(error, state, next_state, rtol, atol):
+    # RMS norm of the error scaled by the mixed tolerance of each component
+    scale = atol + rtol * np.maximum(np.abs(state), np.abs(next_state))
+    return np.sqrt(np.mean((error / scale) ** 2))
@@ -6,12 +6,22 @@ email: els.obrq@gmail.com
 """
 from .HamilCalcLimit import HamilCalcLimit
 import numpy as np
-import copy
 from .LinearCoordinate import LinearCoordinate
 from .PolarCoordinate import PolarCoordinate
-from Thrust.Thruster import Thruster
+from .DormandPrince import calc_error_norm
+from Thrust.Thruster import Thruster, PROGRESSIVE, REGRESSIVE
+from Thrust.ThrusterBank import ThrusterBank
 ONE_D = '1D'
 POLAR = 'polar'
+RK4 = 'rk4'
+EVENTS = 'events'
+DOPRI45 = 'dopri45'
+FULL = 'full'
+DECIMATED = 'decimated'
+SUMMARY = 'summary'
+# Minimum number of engines to update the thrust with ThrusterBank in run_simulation. With less engines the loop of
+# Thruster objects is faster than the vectorized update of small arrays
+BANK_MIN_ENGINES = 8
 
 
 class Dynamics(object):
@@ -37,6 +47,10 @@ class Dynamics(object):
         self.thrusters = []
         self.controller_parameters = []
         self.controller_function = None
+        # Controller of run_simulation_batch in the polar reference frame: function of the states (n_case, 5) and the
+        # engine parameters that returns the control signal (n_case, n_engine) and the thrust angle psi (n_case,)
+        self.batch_controller_function = self.polar_affine_control
+        self.propagator = RK4
 
     def set_engines_properties(self, thruster_properties, propellant_properties, burn_type=None):
         self.thrusters = []
@@ -54,20 +68,53 @@ class Dynamics(object):
             self.thrusters[n_engine].set_t_burn(value)
         return
 
-    def run_simulation(self, x0, xf, time_options):
-        x_states = [np.array(x0)]
-        time_series = [time_options[0]]
-        self.step_width = time_options[2]
-        self.dynamic_model.dt = self.step_width
-
+    def set_step_width(self, dt):
+        # Step width of the propagation, of the engines and of the dead time of the propellants
+        self.step_width = dt
+        self.dynamic_model.dt = dt
         for thruster in self.thrusters:
-            thruster.step_width = self.step_width
-        thr = []
+            thruster.step_width = dt
+            thruster.selected_propellant.dt = dt
+        return
+
+    def run_simulation(self, x0, xf, time_options, record=FULL, decimation=10):
+        """
+        :param record: FULL returns the state and thrust of each step, DECIMATED one of each 'decimation' samples
+            (see decimate_simulation) and SUMMARY only the dict of get_simulation_summary. With the RK4 propagator the
+            summary is tracked during the propagation, without saving the trajectory.
+        """
+        if self.propagator == EVENTS or self.propagator == DOPRI45:
+            if self.propagator == EVENTS:
+                output = self.run_simulation_events(x0, xf, time_options)
+            else:
+                output = self.run_simulation_adaptive(x0, xf, time_options)
+            if record == SUMMARY:
+                return self.get_simulation_summary(output)
+            return self.decimate_simulation(output, decimation) if record == DECIMATED else output
+        if record == DECIMATED:
+            return self.decimate_simulation(self.run_simulation(x0, xf, time_options), decimation)
+        summary = record == SUMMARY
+        self.set_step_width(time_options[2])
+        if summary:
+            x_states, thr = None, None
+            current_x = np.array(x0, dtype=float)
+            min_alt, max_vel = current_x[0], current_x[1]
+        else:
+            # Preallocated trajectory, it grows if the simulation time is exceeded and it is trimmed at the end
+            x_states = np.zeros((int(time_options[1] / self.step_width) + 2, len(x0)))
+            thr = np.zeros(len(x_states))
+            x_states[0] = x0
+            current_x = x_states[0]
+        x_land, last_x = None, current_x
+        bank = None
+        if self.controller_type == 'affine_function' and len(self.thrusters) >= BANK_MIN_ENGINES and \
+                ThrusterBank.is_supported(self.thrusters):
+            bank = ThrusterBank(self.thrusters, self.controller_parameters)
+        n_states = 1
         index_control = []
         end_index_control = []
         end_condition = False
         k = 0
-        current_x = x0
         touch_surface = False
         land_index = 0
         while end_condition is False:
@@ -77,6 +124,8 @@ class Dynamics(object):
                 self.thrusters[0].set_beta(1 if np.sign(control_signal) < 0 else 0)
                 self.thrusters[0].propagate_thr()
                 total_thrust = self.thrusters[0].get_current_thrust()
+            elif bank is not None:
+                total_thrust = bank.update(current_x, k, index_control, end_index_control)
             elif self.controller_type == 'affine_function':
                 # Get total thrust
                 for j in range(len(self.thrusters)):
@@ -88,22 +137,35 @@ class Dynamics(object):
                     self.thrusters[j].set_beta(control_signal, n_engine=j)
                     self.thrusters[j].propagate_thr()
                     total_thrust += self.thrusters[j].get_current_thrust()
-            thr.append(total_thrust)
 
             # dynamics
-            next_x = self.dynamic_model.rungeonestep(current_x, total_thrust)
+            if summary:
+                next_x = self.dynamic_model.rungeonestep(current_x, total_thrust)
+            else:
+                if k + 1 == len(x_states):
+                    x_states = np.concatenate((x_states, np.zeros(np.shape(x_states))))
+                    thr = np.concatenate((thr, np.zeros(len(thr))))
+                thr[k] = total_thrust
+                next_x = self.dynamic_model.rungeonestep(current_x, total_thrust, out=x_states[k + 1])
 
             # ....................
             k += 1
+            previous_x = current_x
             current_x = next_x
-            all_thrust_burned = [self.thrusters[j].thr_is_burned for j in range(len(self.thrusters))]
+            if bank is not None:
+                all_thrust_burned = bank.thr_is_burned
+            else:
+                all_thrust_burned = [self.thrusters[j].thr_is_burned for j in range(len(self.thrusters))]
             if next_x[0] <= xf[0] and touch_surface is False:
-                if np.abs(next_x[0]) <= np.abs(x_states[-1][0]):
+                if np.abs(next_x[0]) <= np.abs(previous_x[0]):
                     land_index = k
                 else:
                     land_index = k - 1
                 touch_surface = True
+                if summary:
+                    x_land = next_x if land_index == k else previous_x
             # else:
+            save_state = False
             if next_x[2] < 0:
                 # True when the propellant uses all mass of the module. Error.
                 end_condition = True
@@ -111,19 +173,588 @@ class Dynamics(object):
                 end_condition = True
                 for h in range(len(end_index_control), len(index_control)):
                     end_index_control.append(k - 1)
-                if land_index == len(x_states):
-                    x_states.append(next_x)
-                    time_series.append(time_options[0] + k * self.step_width)
-                    thr.append(0)
+                if land_index == n_states:
+                    save_state = True
+                    if not summary:
+                        thr[k] = 0
             else:
-                x_states.append(copy.copy(next_x))
-                time_series.append(time_options[0] + k * self.step_width)
-        if land_index == len(x_states):
+                save_state = True
+            if save_state:
+                n_states += 1
+                if summary:
+                    min_alt, max_vel = min(min_alt, next_x[0]), max(max_vel, next_x[1])
+                    last_x = next_x
+        if bank is not None:
+            bank.save_state()
+        if land_index == n_states:
             land_index -= 1
+            x_land = last_x
+        if land_index == 0:
+            land_index = -1
+            x_land = last_x
+        if summary:
+            return {'x_land': x_land, 'land_index': land_index, 'min_alt': min_alt, 'max_vel': max_vel,
+                    'final_time': time_options[0] + (n_states - 1) * self.step_width, 'x_final': last_x,
+                    'index_control': index_control, 'end_index_control': end_index_control}
+        x_states = np.array(x_states[:n_states])
+        time_series = time_options[0] + np.arange(n_states) * self.step_width
+        return x_states, time_series, np.array(thr[:n_states]), index_control, end_index_control, land_index
+
+    @staticmethod
+    def get_simulation_summary(output):
+        """
+        Summary of a simulation output (x_states, time_series, thr, index_control, end_index_control, land_index):
+        state at the landing index, minimum altitude, maximum velocity, final time, final state and burn indexes.
+        """
+        x_states, time_series, _, index_control, end_index_control, land_index = output
+        return {'x_land': x_states[land_index], 'land_index': land_index, 'min_alt': np.min(x_states[:, 0]),
+                'max_vel': np.max(x_states[:, 1]), 'final_time': np.max(time_series), 'x_final': x_states[-1],
+                'index_control': index_control, 'end_index_control': end_index_control}
+
+    @staticmethod
+    def decimate_simulation(output, decimation):
+        """
+        One of each 'decimation' samples of a simulation output. The samples of the ignitions, burnouts, landing and
+        the last one are kept, and the indexes are updated to the decimated samples.
+        """
+        x_states, time_series, thr, index_control, end_index_control, land_index = output
+        n_states = len(x_states)
+        keep = np.unique(np.concatenate((np.arange(0, n_states, decimation), index_control, end_index_control,
+                                         [land_index % n_states, n_states - 1])).astype(int))
+        keep = keep[(keep >= 0) & (keep < n_states)]
+        new_index = lambda index: [int(i) for i in np.searchsorted(keep, index)]
+        land_index = -1 if land_index == -1 else new_index([land_index])[0]
+        return x_states[keep], time_series[keep], thr[keep], new_index(index_control), new_index(end_index_control), \
+            land_index
+
+    def run_simulation_adaptive(self, x0, xf, time_options, rtol=1e-9, atol=1e-9, max_step=10.0, event_tol=1e-9):
+        """
+        Propagation with the embedded Dormand-Prince 5(4) step and the affine controller (1D reference frame).
+        While all the engines are off (coast) the step width is adapted with the error estimate, and the step that
+        crosses the switching function a * h + b * v of an idle engine or the surface is shortened by bisection
+        until the event is located within event_tol. The state that reaches the surface is set on it. The ignition
+        dead time and the burns use steps of time_options[2], as the thrust model of each engine is defined by steps.
+
+        :param rtol: relative tolerance of the error control
+        :param atol: absolute tolerance of the error control
+        :param max_step: maximum step width of the coast [s]
+        :param event_tol: time tolerance of the event location [s]
+        :return: x_states, time_series, thr, index_control, end_index_control and land_index at each step
+        """
+        if self.reference_frame != ONE_D:
+            raise ValueError("The adaptive propagator is only defined for the 1D reference frame")
+        self.set_step_width(time_options[2])
+        n_engine = len(self.thrusters)
+        a = np.array([self.controller_parameters[j][0] for j in range(n_engine)])
+        b = np.array([self.controller_parameters[j][1] for j in range(n_engine)])
+        end_time = time_options[0] + time_options[1]
+
+        current_x = np.array(x0, dtype=float)
+        current_time = time_options[0]
+        x_states = [current_x]
+        time_series = [current_time]
+        thr = []
+        index_control = []
+        end_index_control = []
+        land_index = 0
+        touch_surface = False
+        coast_step = self.step_width
+        while True:
+            k = len(x_states) - 1
+            total_thrust = 0
+            control_signal = np.zeros(n_engine, dtype=bool)
+            for j in range(n_engine):
+                control_signal[j] = self.controller_function(self.controller_parameters[j], current_x,
+                                                             type_control='affine') == 1
+                if control_signal[j] and self.thrusters[j].current_beta == 0:
+                    index_control.append(k)
+                if self.thrusters[j].thr_is_burned and self.thrusters[j].thr_is_on:
+                    end_index_control.append(k - 1)
+                self.thrusters[j].set_beta(int(control_signal[j]), n_engine=j)
+                self.thrusters[j].propagate_thr()
+                total_thrust += self.thrusters[j].get_current_thrust()
+            is_burned = np.array([thruster.thr_is_burned for thruster in self.thrusters], dtype=bool)
+            is_on = np.array([thruster.thr_is_on for thruster in self.thrusters], dtype=bool)
+
+            if total_thrust == 0 and not np.any(is_on | (control_signal & ~is_burned)):
+                # Coast: adaptive step and location of the events
+                idle = ~control_signal & ~is_burned
+                # The surface is an event of each coast above it, also after a lift-off
+                above_surface = current_x[0] > xf[0]
+
+                def event_crossed(x):
+                    crossed = np.any(a[idle] * x[0] + b[idle] * x[1] <= 0)
+                    return crossed or (above_surface and x[0] <= xf[0])
+
+                max_width = max_step if current_time >= end_time else min(max_step, end_time - current_time)
+                step = min(coast_step, max_width)
+                while True:
+                    next_x, error = self.dynamic_model.dormand_prince_step(current_x, 0, step)
+                    error_norm = calc_error_norm(error, current_x, next_x, rtol, atol)
+                    if error_norm <= 1.0:
+                        break
+                    step *= max(0.2, 0.9 * error_norm ** -0.2)
+                coast_step = step * (5.0 if error_norm == 0 else min(5.0, 0.9 * error_norm ** -0.2))
+                if event_crossed(next_x):
+                    step_left, step_right = 0.0, step
+                    while step_right - step_left > event_tol:
+                        step_mid = 0.5 * (step_left + step_right)
+                        mid_x, _ = self.dynamic_model.dormand_prince_step(current_x, 0, step_mid)
+                        if event_crossed(mid_x):
+                            step_right, next_x = step_mid, mid_x
+                        else:
+                            step_left = step_mid
+                    step = step_right
+                    if above_surface and next_x[0] <= xf[0]:
+                        next_x[0] = xf[0]
+            else:
+                next_x, _ = self.dynamic_model.dormand_prince_step(current_x, total_thrust, self.step_width)
+                step = self.step_width
+                coast_step = self.step_width
+            current_time += step
+            thr.append(total_thrust)
+            x_states.append(next_x)
+            time_series.append(current_time)
+            if next_x[0] <= xf[0] and touch_surface is False:
+                land_index = k + 1 if np.abs(next_x[0]) <= np.abs(current_x[0]) else k
+                touch_surface = True
+            current_x = next_x
+            if next_x[-1] < 0:
+                # True when the propellant uses all mass of the module. Error.
+                break
+            elif (current_time > end_time or next_x[0] <= xf[0]) and np.all(is_burned):
+                break
+        thr.append(0)
+        for h in range(len(end_index_control), len(index_control)):
+            end_index_control.append(len(x_states) - 1)
         if land_index == 0:
             land_index = -1
         return np.array(x_states), np.array(time_series), np.array(thr), index_control, end_index_control, land_index
 
+    def run_simulation_events(self, x0, xf, time_options, plateau_tol=1e-6):
+        """
+        Event-driven propagation with the affine controller (1D reference frame). Coast arcs and constant thrust arcs
+        (plateau of the neutral burn without Isp noise) use the closed-form solution of LinearCoordinate and jump to
+        the next event: switching function a * h + b * v of an idle engine, ignition after the dead time, end of the
+        plateau, touchdown, zero velocity and end of the simulation time. The thrust transients and the motion on the
+        surface are propagated with RK4 steps of time_options[2].
+
+        :param plateau_tol: maximum difference between the normalized thrust and 1 to consider it constant
+        :return: x_states, time_series, thr, index_control, end_index_control and land_index at the events and steps
+        """
+        self.set_step_width(time_options[2])
+        engine = self.get_batch_engine_parameters()
+        plateau_start, plateau_end = self.calc_thrust_plateau(engine, plateau_tol)
+        n_engine = len(self.thrusters)
+        t_ignition = np.full(n_engine, np.nan)
+        t_fire = np.full(n_engine, np.inf)
+        armed = np.zeros(n_engine, dtype=bool)
+        burned = np.zeros(n_engine, dtype=bool)
+        end_time = time_options[0] + time_options[1]
+        tolerance = 1e-9
+
+        current_x = np.array(x0, dtype=float)
+        current_time = time_options[0]
+        x_states = [current_x]
+        time_series = [current_time]
+        thr = []
+        index_control = []
+        end_index_control = []
+        land_index = 0
+        touch_surface = False
+        while True:
+            n_sample = len(x_states) - 1
+            # Switching function, ignition after the dead time and burnout
+            new_armed = ~armed & (engine['a'] * current_x[0] + engine['b'] * current_x[1] <= 0)
+            for j in np.flatnonzero(new_armed):
+                index_control.append(n_sample)
+                t_fire[j] = current_time + self.thrusters[j].selected_propellant.get_dead_time()
+            armed |= new_armed
+            for j in np.flatnonzero(armed & np.isnan(t_ignition) & (t_fire <= current_time + tolerance)):
+                t_ignition[j] = current_time
+                self.thrusters[j].selected_propellant.update_bias_isp()
+            burn_time = np.where(np.isnan(t_ignition), -1.0, current_time - t_ignition)
+            new_burned = ~burned & (burn_time > engine['limit_3'])
+            end_index_control += [n_sample] * int(np.sum(new_burned))
+            burned |= new_burned
+            burning = (burn_time >= 0) & ~burned
+
+            # End condition
+            if current_x[2] < 0:
+                break
+            if (current_time > end_time or current_x[0] <= xf[0]) and np.all(burned):
+                break
+
+            in_plateau = (burn_time >= plateau_start - tolerance) & (burn_time < plateau_end - tolerance)
+            thrust = 0
+            for j in np.flatnonzero(burning):
+                thrust += engine['alpha'][j] * self.thrusters[j].selected_propellant.get_c_char()
+            mass_time = np.inf if thrust == 0 else current_x[2] * self.dynamic_model.c_char / thrust
+            segment_events = [mass_time]
+            segment_events += list(t_fire[armed & np.isnan(t_ignition)] - current_time)
+            segment_events += list(t_ignition[burning] + plateau_end[burning] - current_time)
+            if current_time <= end_time:
+                segment_events.append(end_time - current_time + tolerance)
+            free_fall_time = np.inf
+            if thrust == 0 and current_x[0] > xf[0]:
+                # Free fall until the surface
+                free_fall_time = (-current_x[1] - np.sqrt(current_x[1] ** 2 - 2 * self.g_planet *
+                                                          (current_x[0] - xf[0]))) / self.g_planet
+                segment_events.append(free_fall_time)
+            max_segment = min(segment_events)
+
+            if current_x[0] > xf[0] and np.all(in_plateau[burning]) and max_segment < mass_time:
+                # Analytic segment
+                if max_segment <= 0:
+                    # Only the free fall root can vanish above the surface (round-off of the previous segment)
+                    segment, event = 0.0, 'touchdown'
+                else:
+                    segment, event = self.find_segment_event(current_x, thrust, max_segment, xf, engine, armed)
+                    if event is None and segment >= free_fall_time:
+                        # The root of the free fall is the touchdown, the propagated altitude may keep a round-off
+                        event = 'touchdown'
+                next_x = self.dynamic_model.propagate_segment(current_x, thrust, segment)
+                current_time += segment
+                if event == 'touchdown':
+                    next_x[0] = xf[0]
+                    if touch_surface is False:
+                        land_index = n_sample + 1
+                        touch_surface = True
+            else:
+                # RK4 step with the thrust model of each engine
+                shape, _ = ThrusterBank.calc_thrust_shape(engine, burn_time[None, :])
+                thrust = 0
+                for j in np.flatnonzero(burning):
+                    thrust += engine['alpha'][j] * self.thrusters[j].selected_propellant.get_update_noise_isp() \
+                              * shape[0, j]
+                next_x = self.dynamic_model.rungeonestep(current_x, thrust)
+                current_time += self.step_width
+                if next_x[0] <= xf[0] and touch_surface is False:
+                    land_index = n_sample + 1 if np.abs(next_x[0]) <= np.abs(current_x[0]) else n_sample
+                    touch_surface = True
+            thr.append(thrust)
+            x_states.append(next_x)
+            time_series.append(current_time)
+            current_x = next_x
+        thr.append(0)
+        for h in range(len(end_index_control), len(index_control)):
+            end_index_control.append(len(x_states) - 1)
+        if land_index == 0:
+            land_index = -1
+        return np.array(x_states), np.array(time_series), np.array(thr), index_control, end_index_control, land_index
+
+    def find_segment_event(self, state, thrust, max_segment, xf, engine, armed, n_grid=64):
+        """
+        First event of an analytic segment: touchdown, zero velocity or switching function of an idle engine. The
+        event is bracketed in a grid of the segment and located by bisection.
+
+        :return: length of the segment and name of the event (None if the segment ends at max_segment)
+        """
+        def event_functions(t):
+            x = self.dynamic_model.propagate_segment(state, thrust, t)
+            values = [x[0] - xf[0], x[1] * np.sign(state[1])]
+            values += [engine['a'][j] * x[0] + engine['b'][j] * x[1] for j in np.flatnonzero(~armed)]
+            return np.array(values)
+
+        names = ['touchdown', 'velocity'] + ['switching'] * int(np.sum(~armed))
+        t_grid = np.linspace(0, max_segment, n_grid + 1)[1:]
+        crossed = event_functions(t_grid) <= 0
+        crossed[1] = crossed[1] * (state[1] != 0)
+        if not np.any(crossed):
+            return max_segment, None
+        n_step = np.argmax(np.any(crossed, axis=0))
+        n_event = np.argmax(crossed[:, n_step])
+        t_left = 0 if n_step == 0 else t_grid[n_step - 1]
+        t_right = t_grid[n_step]
+        while t_right - t_left > 1e-10 * max(1.0, t_right):
+            t_mid = 0.5 * (t_left + t_right)
+            if event_functions(t_mid)[n_event] <= 0:
+                t_right = t_mid
+            else:
+                t_left = t_mid
+        return t_right, names[n_event]
+
+    def calc_thrust_plateau(self, engine, tolerance):
+        """
+        Burn time interval of each engine where the normalized thrust is constant (1) within the tolerance. It is nan
+        for the engines without plateau (progressive, regressive or with Isp noise).
+        """
+        plateau_start = np.full(len(self.thrusters), np.nan)
+        plateau_end = np.full(len(self.thrusters), np.nan)
+        for j, thruster in enumerate(self.thrusters):
+            if thruster.selected_propellant.std_noise is not None:
+                continue
+            if engine['no_lag'][j]:
+                if engine['no_lag_value'][j] == 1.0:
+                    plateau_start[j], plateau_end[j] = 0.0, thruster.t_burn
+            elif thruster.burn_type not in [PROGRESSIVE, REGRESSIVE]:
+                rise_time = (np.arctanh(1 - 2 * tolerance) / thruster.incline + thruster.g_displacer_point) * \
+                            thruster.dead_time
+                if rise_time < thruster.t_burn + 2 * thruster.dead_time - rise_time:
+                    plateau_start[j] = rise_time
+                    plateau_end[j] = thruster.t_burn + 2 * thruster.dead_time - rise_time
+        return plateau_start, plateau_end
+
+    def run_simulation_batch(self, x0, xf, time_options, isp_bias=None, isp_noise=None, dead_time=None,
+                             engine_parameters=None, record=FULL, decimation=10):
+        """
+        Propagate n_case cases at the same time with the affine controller (1D reference frame), or with
+        batch_controller_function in the polar reference frame, that also gives the thrust angle.
+
+        :param x0: initial states, array (n_case, 3) for 1D or (n_case, 5) for polar
+        :param xf: final state, the surface is xf[0] (radius of the surface for polar)
+        :param time_options: [initial time, simulation time, step width]
+        :param isp_bias: biased Isp [s] of each engine at ignition, array (n_case, n_engine). If None, it is drawn
+            from the propellant properties (isp_bias_std).
+        :param isp_noise: Isp noise [s] of each engine for each burning step, array (n_case, n_engine, n_step).
+            If None, it is drawn from the propellant properties (isp_noise_std).
+        :param dead_time: ignition dead time [s] of each engine, array (n_case, n_engine). If None, it is drawn
+            from the propellant properties (isp_dead_time_max).
+        :param engine_parameters: engine parameters by case (see get_batch_engine_parameters), to propagate different
+            individuals in the same batch. If None, the current properties of the thrusters are used for all cases.
+        :param record: FULL, DECIMATED or SUMMARY as in run_simulation. The summary is tracked during the propagation.
+        :return: list by case of x_states, time_series, thr, index_control, end_index_control and land_index, with
+            the same content as run_simulation, or list by case of the summary dict. For polar, 'min_alt' and
+            'max_vel' of the summary are the minimum radius and the maximum radial velocity.
+        """
+        x0 = np.array(x0, dtype=float)
+        n_case, n_state = np.shape(x0)
+        n_engine = len(self.thrusters)
+        polar = self.reference_frame == POLAR
+        # Reference of the landing error |x[0] - surface| to select the landing index
+        surface = xf[0] if polar else 0
+        self.set_step_width(time_options[2])
+        engine = engine_parameters
+        if engine is None:
+            engine = self.get_batch_engine_parameters()
+        isp_bias, isp_noise, dead_time = self.get_batch_uncertainties(n_case, isp_bias, isp_noise, dead_time,
+                                                                      engine)
+        # Arrays by case. Only the active cases are kept, 'rows' are the indexes of these cases
+        case = {'rows': np.arange(n_case),
+                'x': x0,
+                'c_char_ini': np.zeros((n_case, n_engine)) + engine['c_char'],
+                'dead_time': np.zeros((n_case, n_engine)) + np.reshape(dead_time, (n_case, -1)),
+                'thr_is_on': np.zeros((n_case, n_engine), dtype=bool),
+                'thr_is_burned': np.zeros((n_case, n_engine), dtype=bool),
+                'current_beta': np.zeros((n_case, n_engine), dtype=bool),
+                'current_burn_time': np.zeros((n_case, n_engine)),
+                'current_dead_time': np.zeros((n_case, n_engine)),
+                'n_noise': np.zeros((n_case, n_engine), dtype=int),
+                'touch_surface': np.zeros(n_case, dtype=bool),
+                'chunk_row': np.arange(n_case)}
+        summary = record == SUMMARY
+        if summary:
+            case['min_alt'] = np.array(x0[:, 0])
+            case['max_vel'] = np.array(x0[:, 1])
+            case['x_land'] = np.zeros((n_case, n_state))
+            min_alt, max_vel, x_land = np.zeros(n_case), np.zeros(n_case), np.zeros((n_case, n_state))
+        if isp_bias is not None:
+            case['c_char_ini'] = np.zeros((n_case, n_engine)) + np.reshape(isp_bias, (n_case, -1)) * self.ge
+        case['c_char'] = np.array(case['c_char_ini'])
+        if isp_noise is not None:
+            case['isp_noise'] = np.reshape(isp_noise, (n_case, n_engine, -1))
+        engine = dict(engine)
+        engine['by_case'] = [key for key in engine.keys() if np.ndim(engine[key]) == 2]
+
+        index_control = [[] for _ in range(n_case)]
+        end_index_control = [[] for _ in range(n_case)]
+        land_index = np.zeros(n_case, dtype=int)
+        last_step = np.zeros(n_case, dtype=int)
+        save_last_state = np.zeros(n_case, dtype=bool)
+        last_x = np.zeros((n_case, n_state))
+        last_thr = np.zeros(n_case)
+        # The trajectory is saved by chunks of steps, with the cases that were active at the start of each chunk
+        size_chunk = 512
+        chunks = []
+        if not summary:
+            chunks = [[case['rows'], 0, np.zeros((n_case, size_chunk, n_state)), np.zeros((n_case, size_chunk))]]
+            chunks[0][2][:, 0, :] = x0
+        k = 0
+        while len(case['rows']) > 0:
+            current_x = case['x']
+            # Controller
+            psi = 0
+            if polar:
+                control_signal, psi = self.batch_controller_function(current_x, engine)
+            else:
+                control_signal = engine['a'] * current_x[:, 0:1] + engine['b'] * current_x[:, 1:2] <= 0
+            ignition = control_signal & ~case['current_beta']
+            new_end_index = case['thr_is_burned'] & case['thr_is_on']
+            if ignition.any():
+                for n_row in np.flatnonzero(ignition.any(axis=1)):
+                    index_control[case['rows'][n_row]] += [k] * int(ignition[n_row].sum())
+            if new_end_index.any():
+                for n_row in np.flatnonzero(new_end_index.any(axis=1)):
+                    end_index_control[case['rows'][n_row]] += [k - 1] * int(new_end_index[n_row].sum())
+
+            # Set beta
+            ignition &= ~case['thr_is_burned']
+            ready = case['current_dead_time'] >= case['dead_time']
+            case['current_dead_time'] = np.where(ignition & ~ready, case['current_dead_time'] + engine['dt_dead'],
+                                                 case['current_dead_time'])
+            case['thr_is_on'] |= ignition & ready
+            case['current_beta'] |= ignition & ready
+            case['current_beta'] &= case['thr_is_burned'] | control_signal | case['thr_is_on']
+            case['thr_is_on'] &= ~case['thr_is_burned']
+
+            # Propagate thrust
+            thr_is_on = case['thr_is_on']
+            first_step = thr_is_on & (case['current_burn_time'] == 0)
+            case['c_char'] = np.where(first_step, case['c_char_ini'], case['c_char'])
+            shape, burning = ThrusterBank.calc_thrust_shape(engine, case['current_burn_time'])
+            burning &= thr_is_on & ~first_step
+            c_noise = case['c_char']
+            if isp_noise is not None:
+                n_noise = np.minimum(case['n_noise'], case['isp_noise'].shape[2] - 1)
+                c_noise = c_noise + np.take_along_axis(case['isp_noise'], n_noise[:, :, None], axis=2)[:, :, 0] \
+                    * self.ge
+                case['n_noise'] += burning
+            current_mag_thrust = np.where(burning, engine['alpha'] * c_noise * shape, 0.0)
+            case['thr_is_burned'] |= thr_is_on & ~first_step & ~burning
+            case['current_burn_time'] = np.where(first_step | burning, case['current_burn_time'] + engine['dt'],
+                                                 case['current_burn_time'])
+            total_thrust = 0
+            for j in range(n_engine):
+                total_thrust += current_mag_thrust[:, j]
+
+            # Dynamics
+            next_x = self.dynamic_model.rungeonestep_batch(current_x, total_thrust, psi)
+            case['x'] = next_x
+            k += 1
+            if not summary:
+                if k == chunks[-1][1] + size_chunk:
+                    chunks.append([case['rows'], k, np.zeros((len(case['rows']), size_chunk, n_state)),
+                                   np.zeros((len(case['rows']), size_chunk))])
+                    case['chunk_row'] = np.arange(len(case['rows']))
+                chunks[-1][2][case['chunk_row'], k - chunks[-1][1], :] = next_x
+                chunks[-1][3][case['chunk_row'], k - chunks[-1][1]] = total_thrust
+
+            # End condition
+            rows = case['rows']
+            on_surface = next_x[:, 0] <= xf[0]
+            new_touch = on_surface & ~case['touch_surface']
+            if np.any(new_touch):
+                land_now = np.abs(next_x[:, 0] - surface) <= np.abs(current_x[:, 0] - surface)
+                land_index[rows[new_touch]] = np.where(land_now[new_touch], k, k - 1)
+                case['touch_surface'] |= new_touch
+                if summary:
+                    case['x_land'][new_touch] = np.where(land_now[:, None], next_x, current_x)[new_touch]
+            mass_end = next_x[:, -1] < 0
+            normal_end = ~mass_end & ((time_options[1] < k * self.step_width) | on_surface) \
+                & np.all(case['thr_is_burned'], axis=1)
+            end_case = mass_end | normal_end
+            if summary:
+                # The last state is saved only if the landing is detected in the last step
+                save_state = ~end_case | (normal_end & (land_index[rows] == k))
+                case['min_alt'] = np.where(save_state, np.minimum(case['min_alt'], next_x[:, 0]), case['min_alt'])
+                case['max_vel'] = np.where(save_state, np.maximum(case['max_vel'], next_x[:, 1]), case['max_vel'])
+            if np.any(end_case):
+                for n_row in np.flatnonzero(normal_end):
+                    end_index_control[rows[n_row]] += [k - 1] * (len(index_control[rows[n_row]]) -
+                                                                 len(end_index_control[rows[n_row]]))
+                save_last_state[rows[normal_end]] = land_index[rows[normal_end]] == k
+                last_step[rows[end_case]] = k
+                last_x[rows[end_case]] = next_x[end_case]
+                last_thr[rows[end_case]] = total_thrust[end_case]
+                if summary:
+                    last_x[rows[end_case]] = np.where(save_state[:, None], next_x, current_x)[end_case]
+                    min_alt[rows[end_case]] = case['min_alt'][end_case]
+                    max_vel[rows[end_case]] = case['max_vel'][end_case]
+                    x_land[rows[end_case]] = case['x_land'][end_case]
+                keep = ~end_case
+                for key in case.keys():
+                    case[key] = case[key][keep]
+                for key in engine['by_case']:
+                    engine[key] = engine[key][keep]
+
+        if summary:
+            # Landing index as in run_simulation, the last saved state is used if the landing state is not saved
+            n_states = last_step + save_last_state
+            use_last = (land_index == n_states) | (land_index == 0)
+            x_land[use_last] = last_x[use_last]
+            land_index = np.where(land_index == n_states, land_index - 1, land_index)
+            land_index = np.where(land_index == 0, -1, land_index)
+            return [{'x_land': x_land[i], 'land_index': int(land_index[i]), 'min_alt': min_alt[i],
+                     'max_vel': max_vel[i], 'final_time': time_options[0] + (n_states[i] - 1) * self.step_width,
+                     'x_final': last_x[i], 'index_control': index_control[i],
+                     'end_index_control': end_index_control[i]} for i in range(n_case)]
+        x_states, time_series, thr = [], [], []
+        for n_case_ in range(n_case):
+            x_case, thr_case = [], []
+            for rows, k_start, x_chunk, thr_chunk in chunks:
+                n_row = np.flatnonzero(rows == n_case_)
+                if len(n_row) > 0 and k_start < last_step[n_case_]:
+                    x_case.append(x_chunk[n_row[0], :last_step[n_case_] - k_start])
+                    thr_case.append(thr_chunk[n_row[0], :last_step[n_case_] - k_start])
+            x_case.append(np.reshape([last_x[n_case_]] * int(save_last_state[n_case_]), (-1, n_state)))
+            thr_case[0] = thr_case[0][1:]
+            thr_case.append([last_thr[n_case_]] + [0] * int(save_last_state[n_case_]))
+            x_states.append(np.concatenate(x_case, axis=0))
+            time_series.append(time_options[0] + np.arange(len(x_states[-1])) * self.step_width)
+            thr.append(np.concatenate(thr_case))
+        land_index = np.where(land_index == last_step + save_last_state, land_index - 1, land_index)
+        land_index = np.where(land_index == 0, -1, land_index)
+        output = x_states, time_series, thr, index_control, end_index_control, [int(i) for i in land_index]
+        if record == DECIMATED:
+            decimated = [self.decimate_simulation([out[i] for out in output], decimation) for i in range(n_case)]
+            output = tuple([list(out) for out in zip(*decimated)])
+        return output
+
+    def polar_affine_control(self, x, engine):
+        """
+        Affine controller of the polar reference frame for a (n_case, 5) array of states. The engine j is fired when
+        a_j * h - b_j * |V| <= 0, with the altitude h = r - r_planet and the magnitude of the velocity |V| (the
+        affine function a * h + b * v of 1D for a vertical descent), and the thrust is pointed against the velocity.
+
+        :return: control signal (n_case, n_engine) and thrust angle psi (n_case,) from the local horizontal
+        """
+        alt = x[:, 0] - self.r_moon
+        vel_t = x[:, 0] * x[:, 3]
+        speed = np.sqrt(x[:, 1] ** 2 + vel_t ** 2)
+        control_signal = engine['a'] * alt[:, None] - engine['b'] * speed[:, None] <= 0
+        return control_signal, np.arctan2(-x[:, 1], vel_t)
+
+    def get_batch_engine_parameters(self):
+        """
+        Parameters of each engine as arrays (n_engine,), see ThrusterBank.calc_parameters.
+        """
+        return ThrusterBank.calc_parameters(self.thrusters, self.controller_parameters)
+
+    def get_batch_uncertainties(self, n_case, isp_bias, isp_noise, dead_time, engine_parameters=None):
+        n_engine = len(self.thrusters)
+        propellant = self.thrusters[0].selected_propellant
+        if isp_bias is None and propellant.std_bias is not None:
+            isp_bias = np.random.normal(propellant.isp0, propellant.std_bias, size=(n_case, n_engine))
+        if isp_noise is None and propellant.std_noise is not None:
+            if engine_parameters is None:
+                engine_parameters = self.get_batch_engine_parameters()
+            n_step = int(np.ceil(np.max(engine_parameters['limit_3']) / self.step_width)) + 2
+            isp_noise = np.random.normal(0, propellant.std_noise, size=(n_case, n_engine, n_step))
+        if dead_time is None:
+            dead_time = np.zeros((n_case, n_engine))
+            if propellant.max_dead_time is not None:
+                dead_time = np.random.uniform(0, propellant.max_dead_time, size=(n_case, n_engine))
+        return isp_bias, isp_noise, dead_time
+
+    def set_case_uncertainties(self, isp_bias, isp_noise, dead_time):
+        """
+        Uncertainties of the engines for the next run_simulation, instead of the random draws of the propellants.
+
+        :param isp_bias: biased Isp [s] of each engine, array (n_engine,) or None
+        :param isp_noise: Isp noise [s] of each engine for each burning step, array (n_engine, n_step) or None
+        :param dead_time: ignition dead time [s] of each engine, array (n_engine,) or None
+        """
+        for j, thruster in enumerate(self.thrusters):
+            thruster.selected_propellant.set_case_values(None if isp_bias is None else float(isp_bias[j]),
+                                                         None if isp_noise is None else isp_noise[j],
+                                                         None if dead_time is None else float(dead_time[j]))
+        return
+
+    @staticmethod
+    def stack_batch_engine_parameters(engine_list, n_repeat=1):
+        # Engine parameters of several individuals as arrays (n_individual * n_repeat, n_engine)
+        return {key: np.repeat([engine[key] for engine in engine_list], n_repeat, axis=0) for key in engine_list[0]}
+
     def calc_limits_by_single_hamiltonian(self, t_burn_min, t_burn_max, alpha_min, alpha_max, plot_data=False):
         self.basic_hamilton_calc.calc_limits_with_const_time(t_burn_min, alpha_min, alpha_max)
         self.basic_hamilton_calc.calc_limits_with_const_alpha(t_burn_min, t_burn_max, alpha_min)
@@ -139,3 +770,42 @@ class Dynamics(object):
             for k in range(len(parameters)):
                 self.controller_parameters[i].append(parameters[k][i])
         return
+
+
+if __name__ == '__main__':
+    # Bounce of progressive engines: the landing of the event-driven and adaptive propagators must be the first
+    # touchdown of RK4, and the adaptive coast after the lift-off must end on the surface.
+    # Run with: python -m Dynamics.Dynamics
+    dynamics_properties = [0.01, 212, -1.62, 4.9048695e12, 1738e3, 24, ONE_D]
+    propellant_properties_ = {'propellant_name': 'TRX-H609', 'n_thrusters': 3, 'pulse_thruster': 3, 'geometry': None,
+                              'propellant_geometry': PROGRESSIVE, 'isp_noise_std': None, 'isp_bias_std': None,
+                              'isp_dead_time_max': 0}
+    thruster_properties_ = {'throat_diameter': 2, 'engine_diameter_ext': None, 'height': 10.0,
+                            'performance': {'alpha': 0.026, 't_burn': 11.2}, 'load_thrust_profile': False,
+                            'file_name': 'Thrust/StarGrain7.csv', 'dead_time': 0.2, 'lag_coef': 0.5}
+    engine_alpha = [0.026, 0.0427, 0.0449]
+    engine_t_burn = [11.2, 9.57, 19.19]
+    ctrl_a = [0.2862, 0.239, 0.2015]
+    ctrl_b = [8.45, 9.388, 0.226]
+
+    def affine_control(control_par, current_state, type_control='affine'):
+        return 1 if control_par[0] * current_state[0] + control_par[1] * current_state[1] <= 0 else 0
+
+    landing = {}
+    for propagator in [RK4, EVENTS, DOPRI45]:
+        dynamics = Dynamics(*dynamics_properties, controller='affine_function')
+        dynamics.set_engines_properties(thruster_properties_, propellant_properties_)
+        for n in range(3):
+            dynamics.modify_individual_engine(n, 'alpha', engine_alpha[n])
+            dynamics.modify_individual_engine(n, 't_burn', engine_t_burn[n])
+        dynamics.set_controller_parameters([ctrl_a, ctrl_b])
+        dynamics.controller_function = affine_control
+        dynamics.propagator = propagator
+        summary = dynamics.get_simulation_summary(dynamics.run_simulation([1945.67, -1.466, 24], [0, 0, 0],
+                                                                          [0.0, 300, 0.01]))
+        landing[propagator] = summary['x_land'][1], summary['x_final'][0]
+        print(propagator, 'landing velocity [m/s]: ', summary['x_land'][1], ', final time [s]: ',
+              summary['final_time'], ', minimum altitude [m]: ', summary['min_alt'])
+    for propagator in [EVENTS, DOPRI45]:
+        assert abs(landing[propagator][0] - landing[RK4][0]) < 0.1
+        assert abs(landing[propagator][1] - landing[RK4][1]) < 1.0
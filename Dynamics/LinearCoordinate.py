@@ -7,6 +7,7 @@ els.obrq@gmail.com
 
 """
 import numpy as np
+from .DormandPrince import dormand_prince_step
 ge = 9.807
 
 
@@ -38,18 +39,79 @@ class LinearCoordinate(object):
         rhs[2] = -T / self.c_char
         return rhs
 
-    def rungeonestep(self, state, thrust, psi=0):
-        # At each step of the Runge consider constant thrust
+    def dynamics_1d_scalar(self, alt, vx, mass, T, alt_fixed):
+        # Same model as dynamics_1d with scalar values. alt_fixed: altitude at the beginning of the step
+        acc = self.g_planet + T / mass
+        if alt_fixed <= 0.0 and alt <= alt_fixed:
+            vx = 0 if vx < 0 else vx
+            acc = acc if abs(self.g_planet) < abs(T / mass) else 0
+        return vx, acc, -T / self.c_char
+
+    def rungeonestep(self, state, thrust, psi=0, out=None):
+        # At each step of the Runge consider constant thrust. The step uses scalar locals, the next state is written
+        # in out if it is given
+        alt, vx, mass = float(state[0]), float(state[1]), float(state[2])
+        if alt <= 0 and vx < 0:
+            vx = 0.0
+        half_dt = self.dt / 2.0
+        k1 = self.dynamics_1d_scalar(alt, vx, mass, thrust, alt)
+        k2 = self.dynamics_1d_scalar(alt + half_dt * k1[0], vx + half_dt * k1[1], mass + half_dt * k1[2], thrust, alt)
+        k3 = self.dynamics_1d_scalar(alt + half_dt * k2[0], vx + half_dt * k2[1], mass + half_dt * k2[2], thrust, alt)
+        k4 = self.dynamics_1d_scalar(alt + self.dt * k3[0], vx + self.dt * k3[1], mass + self.dt * k3[2], thrust, alt)
+        sixth_dt = self.dt / 6.0
+        if out is None:
+            out = np.empty(3)
+        out[0] = alt + sixth_dt * (k1[0] + 2.0 * k2[0] + 2.0 * k3[0] + k4[0])
+        out[1] = vx + sixth_dt * (k1[1] + 2.0 * k2[1] + 2.0 * k3[1] + k4[1])
+        out[2] = mass + sixth_dt * (k1[2] + 2.0 * k2[2] + 2.0 * k3[2] + k4[2])
+        return out
+
+    def dormand_prince_step(self, state, thrust, dt, psi=0):
+        # Embedded step of width dt with constant thrust. Returns the next state and its error estimate
         self.x_fixed = np.array(state)
         if self.x_fixed[0] <= 0 and self.x_fixed[1] < 0:
             self.x_fixed[1] = 0
-        x1 = self.x_fixed
-        k1 = self.dynamics_1d(x1, thrust, psi)
-        xk2 = x1 + (self.dt / 2.0) * k1
-        k2 = self.dynamics_1d(xk2, thrust, psi)
-        xk3 = x1 + (self.dt / 2.0) * k2
-        k3 = self.dynamics_1d(xk3, thrust, psi)
-        xk4 = x1 + self.dt * k3
-        k4 = self.dynamics_1d(xk4, thrust, psi)
-        next_x = x1 + (self.dt / 6.0) * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+        return dormand_prince_step(lambda x: self.dynamics_1d(x, thrust, psi), self.x_fixed, dt)
+
+    def dynamics_1d_batch(self, alt, vx, mass, T, alt_fixed):
+        # Same model as dynamics_1d for arrays of cases (n_case,). alt_fixed: altitude at the beginning of the step
+        acc = self.g_planet + T / mass
+        on_ground = (alt_fixed <= 0.0) & (alt <= alt_fixed)
+        d_alt = np.where(on_ground & (vx < 0), 0, vx)
+        d_vx = np.where(on_ground & (np.abs(self.g_planet) >= np.abs(T / mass)), 0, acc)
+        d_mass = -T / self.c_char
+        return d_alt, d_vx, d_mass
+
+    def rungeonestep_batch(self, state, thrust, psi=0):
+        # Same step as rungeonestep for a (n_case, 3) array of states and a (n_case,) array of thrust
+        alt, vx, mass = state[:, 0], state[:, 1], state[:, 2]
+        vx = np.where((alt <= 0) & (vx < 0), 0, vx)
+        k1 = self.dynamics_1d_batch(alt, vx, mass, thrust, alt)
+        k2 = self.dynamics_1d_batch(alt + (self.dt / 2.0) * k1[0], vx + (self.dt / 2.0) * k1[1],
+                                    mass + (self.dt / 2.0) * k1[2], thrust, alt)
+        k3 = self.dynamics_1d_batch(alt + (self.dt / 2.0) * k2[0], vx + (self.dt / 2.0) * k2[1],
+                                    mass + (self.dt / 2.0) * k2[2], thrust, alt)
+        k4 = self.dynamics_1d_batch(alt + self.dt * k3[0], vx + self.dt * k3[1], mass + self.dt * k3[2], thrust, alt)
+        next_x = np.empty(np.shape(state))
+        next_x[:, 0] = alt + (self.dt / 6.0) * (k1[0] + 2.0 * k2[0] + 2.0 * k3[0] + k4[0])
+        next_x[:, 1] = vx + (self.dt / 6.0) * (k1[1] + 2.0 * k2[1] + 2.0 * k3[1] + k4[1])
+        next_x[:, 2] = mass + (self.dt / 6.0) * (k1[2] + 2.0 * k2[2] + 2.0 * k3[2] + k4[2])
         return next_x
+
+    def propagate_segment(self, state, thrust, t):
+        """
+        Closed-form solution of dynamics_1d above the surface for a constant thrust (free fall if thrust is zero),
+        where the mass flow is thrust / c_char (rocket equation). t can be a scalar or an array of times.
+        """
+        alt, vx, mass = state[0], state[1], state[2]
+        t = np.asarray(t, dtype=float)
+        if thrust == 0:
+            return np.array([alt + vx * t + 0.5 * self.g_planet * t ** 2, vx + self.g_planet * t,
+                             mass + 0 * t])
+        mass_flow = thrust / self.c_char
+        u = 1 - mass_flow * t / mass
+        log_u = np.log(u)
+        return np.array([alt + vx * t + 0.5 * self.g_planet * t ** 2
+                         + self.c_char * mass / mass_flow * (u * log_u - u + 1),
+                         vx + self.g_planet * t - self.c_char * log_u,
+                         mass * u])
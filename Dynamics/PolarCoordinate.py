@@ -8,6 +8,7 @@ els.obrq@gmail.com
 """
 
 import numpy as np
+from .DormandPrince import dormand_prince_step
 
 
 class PolarCoordinate(object):
@@ -37,14 +38,51 @@ class PolarCoordinate(object):
         rhs[4] = - T/self.c_char
         return rhs
 
-    def rungeonestep(self, state, T, psi=0):
-        x = np.array(state)
-        k1 = self.dynamics_polar(x, T, psi)
-        xk2 = x + (self.dt / 2.0) * k1
-        k2 = self.dynamics_polar(xk2, T, psi)
-        xk3 = x + (self.dt / 2.0) * k2
-        k3 = self.dynamics_polar(xk3, T, psi)
-        xk4 = x + self.dt * k3
-        k4 = self.dynamics_polar(xk4, T, psi)
-        next_x = x + (self.dt / 6.0) * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+    def dynamics_polar_scalar(self, r, v, omega, m, T, sin_psi, cos_psi):
+        # Same model as dynamics_polar with scalar values or arrays of cases (theta does not appear in the model)
+        return (v,
+                T/m * sin_psi - self.mu/(r * r) + r * (omega * omega),
+                omega,
+                -(T/m * cos_psi + 2 * v * omega)/r,
+                - T/self.c_char)
+
+    def rungeonestep(self, state, T, psi=0, out=None):
+        # The step uses scalar locals, the next state is written in out if it is given
+        x = [float(state[i]) for i in range(5)]
+        sin_psi, cos_psi = np.sin(psi), np.cos(psi)
+        half_dt = self.dt / 2.0
+        k1 = self.dynamics_polar_scalar(x[0], x[1], x[3], x[4], T, sin_psi, cos_psi)
+        k2 = self.dynamics_polar_scalar(x[0] + half_dt * k1[0], x[1] + half_dt * k1[1], x[3] + half_dt * k1[3],
+                                        x[4] + half_dt * k1[4], T, sin_psi, cos_psi)
+        k3 = self.dynamics_polar_scalar(x[0] + half_dt * k2[0], x[1] + half_dt * k2[1], x[3] + half_dt * k2[3],
+                                        x[4] + half_dt * k2[4], T, sin_psi, cos_psi)
+        k4 = self.dynamics_polar_scalar(x[0] + self.dt * k3[0], x[1] + self.dt * k3[1], x[3] + self.dt * k3[3],
+                                        x[4] + self.dt * k3[4], T, sin_psi, cos_psi)
+        sixth_dt = self.dt / 6.0
+        if out is None:
+            out = np.empty(5)
+        for i in range(5):
+            out[i] = x[i] + sixth_dt * (k1[i] + 2.0 * k2[i] + 2.0 * k3[i] + k4[i])
+        return out
+
+    def rungeonestep_batch(self, state, T, psi=0):
+        # Same step as rungeonestep for a (n_case, 5) array of states and (n_case,) arrays of thrust and thrust angle
+        x = [state[:, i] for i in range(5)]
+        sin_psi, cos_psi = np.sin(psi), np.cos(psi)
+        half_dt = self.dt / 2.0
+        k1 = self.dynamics_polar_scalar(x[0], x[1], x[3], x[4], T, sin_psi, cos_psi)
+        k2 = self.dynamics_polar_scalar(x[0] + half_dt * k1[0], x[1] + half_dt * k1[1], x[3] + half_dt * k1[3],
+                                        x[4] + half_dt * k1[4], T, sin_psi, cos_psi)
+        k3 = self.dynamics_polar_scalar(x[0] + half_dt * k2[0], x[1] + half_dt * k2[1], x[3] + half_dt * k2[3],
+                                        x[4] + half_dt * k2[4], T, sin_psi, cos_psi)
+        k4 = self.dynamics_polar_scalar(x[0] + self.dt * k3[0], x[1] + self.dt * k3[1], x[3] + self.dt * k3[3],
+                                        x[4] + self.dt * k3[4], T, sin_psi, cos_psi)
+        sixth_dt = self.dt / 6.0
+        next_x = np.empty(np.shape(state))
+        for i in range(5):
+            next_x[:, i] = x[i] + sixth_dt * (k1[i] + 2.0 * k2[i] + 2.0 * k3[i] + k4[i])
         return next_x
+
+    def dormand_prince_step(self, state, T, dt, psi=0):
+        # Embedded step of width dt with constant thrust. Returns the next state and its error estimate
+        return dormand_prince_step(lambda x: self.dynamics_polar(x, T, psi), state, dt)
@@ -6,10 +6,55 @@ Created by:
 els.obrq@gmail.com
 
 """
+import multiprocessing
 import matplotlib.pyplot as plt
+from copy import deepcopy
 
 from tools.MonteCarlo import MonteCarlo
 from tools.Viewer import *
+from tools.LandingStatistics import LandingStatistics
+from tools.ScenarioBank import ScenarioBank
+from tools.CrossEntropySampler import CrossEntropySampler
+from Dynamics.Dynamics import FULL, SUMMARY
+
+PAR_FORCE = 1
+# Maximum number of cases of a batch simulation or of a task of the workers
+MAX_BATCH_CASES = 1000
+# Number of cases of each block of the evaluation with a stopping rule
+CASE_BLOCK = 15
+
+# Dynamics by number of engines of the process that runs the tasks of the evaluation (see init_worker and run_task)
+worker_dynamics = None
+
+
+def init_worker(dynamics):
+    global worker_dynamics
+    worker_dynamics = dynamics
+    return
+
+
+def run_task(task):
+    """
+    Propagate a chunk of cases of a number of engines with worker_dynamics.
+
+    :param task: (n_thr, cases, x0, xf, time_options, seed, record, case_values), where the random generator is
+        seeded with (seed, case) before the propagation of each case, so the output of a case does not depend on the
+        chunk or on the worker that runs it, and all the numbers of engines use the same random values in each case.
+        case_values are the uncertainties of each case of a scenario bank (see ScenarioBank.get_case_values), or None.
+    :return: list by case of the output of run_simulation
+    """
+    n_thr, cases, x0, xf, time_options, seed, record, case_values = task
+    dynamics = worker_dynamics[n_thr]
+    output = []
+    for i, k in enumerate(cases):
+        np.random.seed([seed, k])
+        # The values of the case are set before the reset, which draws the dead time without them
+        if case_values is not None:
+            dynamics.set_case_uncertainties(*case_values[i])
+        for thrust in dynamics.thrusters:
+            thrust.reset_variables()
+        output.append(dynamics.run_simulation(x0[i], xf, time_options, record=record))
+    return output
 
 
 class Evaluation(object):
@@ -32,99 +77,328 @@ class Evaluation(object):
         self.folder_name = folder_name
         if self.folder_name is None:
             self.folder_name = ""
+        # Full simulation output [X_states, TIME, THR, IC, EC, LAND_INDEX] of the cases by number of engines, if they
+        # are kept, and LandingStatistics and number of cases by number of engines of the last evaluation
+        self.trajectories = {}
+        self.statistics = {}
+        self.n_case_used = {}
 
-    def propagate(self, n_case, n_thrusters, state_noise=None):
-        # # Generation of case (Monte Carlo)
-        rN = []
-        vN = []
-        mN = []
-
-        state_noise_flag = False
-        if state_noise is not None:
-            state_noise_flag = state_noise[0]
-            sdr = state_noise[1]
-            sdv = state_noise[2]
-            sdm = state_noise[3]
-            rN = MonteCarlo(self.x0[0], sdr, n_case).random_value()
-            vN = MonteCarlo(self.x0[1], sdv, n_case).random_value()
-            mN = MonteCarlo(self.x0[2], sdm, n_case).random_value()
-
-        X_states = []
-        THR = []
-        IC = []
-        EC = []
-        TIME = []
-        LAND_INDEX = []
-
-        par_force = 1
-        i_n = 0
-        performance_list = []
-        for n_thr in n_thrusters:
-            print("Evaluating with ", n_thr, " number of engine...")
-            pulse_thruster = int(n_thr / par_force)
+    def set_configuration(self, dynamics, n_thr):
+        # Engines of the number of engines n_thr, with the best individual of json_list
+        pulse_thruster = int(n_thr / PAR_FORCE)
 
-            self.propellant_properties['n_thrusters'] = n_thr
-            self.propellant_properties['pulse_thruster'] = pulse_thruster
+        self.propellant_properties['n_thrusters'] = n_thr
+        self.propellant_properties['pulse_thruster'] = pulse_thruster
 
-            self.dynamics.set_engines_properties(self.thruster_properties, self.propellant_properties,
-                                                 self.type_propellant)
+        dynamics.set_engines_properties(self.thruster_properties, self.propellant_properties, self.type_propellant)
 
-            if type(self.json_list[str(n_thr)]['Best_individual'][0]) == float:
-                for j in range(n_thr):
-                    self.dynamics.modify_individual_engine(j, 'alpha',
-                                                           self.json_list[str(n_thr)]['Best_individual'][0])
-                    self.dynamics.modify_individual_engine(j, 't_burn',
-                                                           self.json_list[str(n_thr)]['Best_individual'][1])
-            else:
-                for j in range(n_thr):
-                    self.dynamics.modify_individual_engine(j, 'alpha',
-                                                           self.json_list[str(n_thr)]['Best_individual'][0][j])
-                    self.dynamics.modify_individual_engine(j, 't_burn',
-                                                           self.json_list[str(n_thr)]['Best_individual'][1][j])
-
-            self.dynamics.set_controller_parameters(self.json_list[str(n_thr)]['Best_individual'][2:])
-            X_states.append([])
-            THR.append([])
-            IC.append([])
-            EC.append([])
-            TIME.append([])
-            LAND_INDEX.append([])
-            for k in range(n_case):
-                if state_noise_flag:
-                    x0_ = [rN[k], vN[k], mN[k]]
-                else:
-                    x0_ = self.x0
-
-                x_, time_, thrust_, index_control_, end_index_control_, land_i_ = \
-                    self.dynamics.run_simulation(x0_, self.xf, self.time_options)
-
-                X_states[i_n].append(x_)
-                LAND_INDEX[i_n].append(land_i_)
-                THR[i_n].append(thrust_)
-                TIME[i_n].append(time_)
-                IC[i_n].append(index_control_)
-                EC[i_n].append(end_index_control_)
+        if type(self.json_list[str(n_thr)]['Best_individual'][0]) == float:
+            for j in range(n_thr):
+                dynamics.modify_individual_engine(j, 'alpha', self.json_list[str(n_thr)]['Best_individual'][0])
+                dynamics.modify_individual_engine(j, 't_burn', self.json_list[str(n_thr)]['Best_individual'][1])
+        else:
+            for j in range(n_thr):
+                dynamics.modify_individual_engine(j, 'alpha', self.json_list[str(n_thr)]['Best_individual'][0][j])
+                dynamics.modify_individual_engine(j, 't_burn', self.json_list[str(n_thr)]['Best_individual'][1][j])
+
+        dynamics.set_controller_parameters(self.json_list[str(n_thr)]['Best_individual'][2:])
+        return
 
+    def get_case_initial_states(self, n_case, state_noise=None):
+        """
+        :return: initial state of each case
+        """
+        # # Generation of case (Monte Carlo)
+        if state_noise is None:
+            return np.tile(self.x0, (n_case, 1))
+        sdr = state_noise[1]
+        sdv = state_noise[2]
+        sdm = state_noise[3]
+        rN = MonteCarlo(self.x0[0], sdr, n_case).random_value()
+        vN = MonteCarlo(self.x0[1], sdv, n_case).random_value()
+        mN = MonteCarlo(self.x0[2], sdm, n_case).random_value()
+        if not state_noise[0]:
+            return np.tile(self.x0, (n_case, 1))
+        return np.array([rN, vN, mN]).T
+
+    def get_scenario_bank(self, n_case, state_noise, sampler, seed):
+        """
+        :return: scenario bank of the initial states, Isp bias and dead time of the cases for the engines of the
+            dynamics, sampled jointly with the sampler (see ScenarioBank), or None without sampler
+        """
+        if sampler is None:
+            return None
+        state_std = None
+        if state_noise is not None and state_noise[0]:
+            state_std = state_noise[1:4]
+        return ScenarioBank(self.x0, n_case, self.dynamics.thrusters, None, state_std, seed, sampler)
+
+    def evaluate(self, n_case, n_thrusters, state_noise=None, batch_simulation=False, n_workers=None, seed=None,
+                 keep_trajectories=False, quantiles=None, sampler=None, tolerance=None, probability_tolerance=None,
+                 velocity_limit=None, confidence=0.95, case_block=CASE_BLOCK):
+        """
+        Propagate n_case cases of each number of engines, without plots. The landing state of each case is added to
+        the LandingStatistics of its number of engines in statistics as the case returns, so the memory does not
+        depend on n_case unless the trajectories are kept. With tolerance or probability_tolerance, the cases are
+        propagated in blocks of case_block until the confidence intervals of each number of engines are narrow enough
+        (see is_converged), and n_case is the maximum number of cases. The number of cases of each number of engines
+        is saved in n_case_used.
+
+        :param n_workers: number of processes of the (number of engines, chunk of cases) tasks (see run_task), created
+            with fork (1: without a process pool). If None, the cases are propagated in sequence with the global random
+            state, or in batches of MAX_BATCH_CASES with batch_simulation.
+        :param seed: seed of the random values of the cases with n_workers, the same for any number of workers, and of
+            the sampler. If None, it is drawn from the global random state.
+        :param keep_trajectories: if True, the full simulation output of the cases is saved by number of engines in
+            trajectories (see plot_results). Otherwise only the summary of the landing is propagated.
+        :param quantiles: quantiles of the landing altitude and velocity to estimate (see LandingStatistics), or None
+        :param sampler: RANDOM, SOBOL or LHS to sample jointly the initial state, Isp bias and dead time of the cases
+            of each number of engines with the seed (see MonteCarlo), or None for the random draws of the initial
+            states and of the propellants
+        :param tolerance: maximum half width [m/s] of the confidence intervals of the mean and std of the landing
+            velocity, or None
+        :param probability_tolerance: maximum half width of the confidence interval of the probability of a landing
+            speed higher than velocity_limit [m/s], or None
+        :param confidence: confidence level of the intervals
+        :return: list by number of engines of the landing statistics [mean altitude, mean velocity, std altitude,
+            std velocity]
+        """
+        record = FULL if keep_trajectories else SUMMARY
+        adaptive = tolerance is not None or probability_tolerance is not None
+        x0 = None
+        if sampler is None:
+            x0 = self.get_case_initial_states(n_case, state_noise)
+        if seed is None and (n_workers is not None or sampler is not None):
+            seed = np.random.randint(2 ** 31)
+        scenario = (n_case, state_noise, sampler, seed)
+        self.trajectories = {}
+        self.statistics = {}
+        for n_thr in n_thrusters:
+            self.statistics[n_thr] = LandingStatistics(self.xf, quantiles, velocity_limit=velocity_limit)
+            if keep_trajectories:
+                self.trajectories[n_thr] = [[] for _ in range(6)]
+        banks = {}
+        pool = None
+        if n_workers is not None:
+            # Each worker gets a copy of the dynamics of each number of engines
+            dynamics = {}
+            for n_thr in n_thrusters:
+                self.set_configuration(self.dynamics, n_thr)
+                dynamics[n_thr] = deepcopy(self.dynamics)
+                banks[n_thr] = self.get_scenario_bank(*scenario)
+            if n_workers > 1:
+                pool = multiprocessing.get_context('fork').Pool(n_workers, initializer=init_worker,
+                                                                initargs=(dynamics,))
+            else:
+                init_worker(dynamics)
+
+        active = list(n_thrusters)
+        block = case_block if adaptive else n_case
+        for start in range(0, n_case, block):
+            cases = np.arange(start, min(start + block, n_case))
+            if n_workers is not None:
+                case_outputs = self.run_tasks(x0, banks, seed, active, cases, n_workers, record, pool)
+            else:
+                case_outputs = self.run_cases(x0, banks, scenario, active, cases, batch_simulation, record)
+            for n_thr, output in case_outputs:
+                if record == SUMMARY:
+                    self.statistics[n_thr].add(output['x_land'])
+                    continue
+                for i in range(6):
+                    self.trajectories[n_thr][i].append(output[i])
+                self.statistics[n_thr].add(output[0][output[5]])
+            if adaptive:
+                active = [n_thr for n_thr in active if not self.is_converged(self.statistics[n_thr], tolerance,
+                                                                             probability_tolerance, confidence)]
+                if len(active) == 0:
+                    break
+        if pool is not None:
+            pool.close()
+            pool.join()
+        elif n_workers is not None:
+            init_worker(None)
+        self.n_case_used = {n_thr: self.statistics[n_thr].n_case for n_thr in n_thrusters}
+        if adaptive:
+            print("Number of cases by number of engines: ", self.n_case_used)
+        return [self.statistics[n_thr].get_performance() for n_thr in n_thrusters]
+
+    @staticmethod
+    def is_converged(statistics, tolerance, probability_tolerance, confidence):
+        """
+        Sequential stopping rule: the half width of the confidence intervals of the mean and std of the landing
+        velocity is lower than tolerance, and the one of the failure probability (Wilson) is lower than
+        probability_tolerance (None to skip each test).
+        """
+        if tolerance is not None:
+            mean_interval, std_interval = statistics.get_confidence_intervals(confidence)
+            if max(mean_interval[1, 1] - mean_interval[1, 0], std_interval[1, 1] - std_interval[1, 0]) / 2 > tolerance:
+                return False
+        if probability_tolerance is not None:
+            interval = statistics.get_failure_interval(confidence)[1]
+            if (interval[1] - interval[0]) / 2 > probability_tolerance:
+                return False
+        return True
+
+    def run_cases(self, x0, banks, scenario, n_thrusters, cases, batch_simulation, record):
+        """
+        Propagate the cases of each number of engines in sequence with the global random state, or in batches.
+
+        :param x0: initial state of each case, or None for the states of the scenario bank
+        :param banks: dict of the scenario bank by number of engines, updated with the missing ones
+        :param scenario: (n_case, state_noise, sampler, seed) of the scenario bank (see get_scenario_bank)
+        :param cases: indexes of the cases to propagate
+        :return: generator of the number of engines and the output of each case
+        """
+        for n_thr in n_thrusters:
+            if cases[0] == 0:
+                print("Evaluating with ", n_thr, " number of engine...")
+            self.set_configuration(self.dynamics, n_thr)
+            if n_thr not in banks:
+                banks[n_thr] = self.get_scenario_bank(*scenario)
+            bank = banks[n_thr]
+            case_x0 = x0 if bank is None else bank.x0
+            if batch_simulation:
+                for start in range(0, len(cases), MAX_BATCH_CASES):
+                    rows = cases[start:start + MAX_BATCH_CASES]
+                    uncertainties = [None, None, None] if bank is None else \
+                        [None if bank.isp_bias is None else bank.isp_bias[rows], None, bank.dead_time[rows]]
+                    batch_output = self.dynamics.run_simulation_batch(case_x0[rows], self.xf, self.time_options,
+                                                                      *uncertainties, record=record)
+                    for output in (batch_output if record == SUMMARY else zip(*batch_output)):
+                        yield n_thr, output
+                continue
+            for k in cases:
+                if bank is not None:
+                    self.dynamics.set_case_uncertainties(*bank.get_case_values(k))
+                output = self.dynamics.run_simulation(list(case_x0[k]), self.xf, self.time_options, record=record)
                 # Reset thruster
                 for thrust in self.dynamics.thrusters:
                     thrust.reset_variables()
-
-            pos_sim = [np.array(X_states[i_n][i])[:, 0] for i in range(n_case)]
-            vel_sim = [np.array(X_states[i_n][i])[:, 1] for i in range(n_case)]
-            mass_sim = [np.array(X_states[i_n][i])[:, 2] for i in range(n_case)]
-            thrust_sim = THR[i_n]
-
-            plot_main_parameters(TIME[i_n], pos_sim, vel_sim, mass_sim, thrust_sim, IC[i_n],
-                                 EC[i_n], save=False)
-            plot_state_vector(pos_sim, vel_sim, IC[i_n], EC[i_n], folder_name=self.folder_name,
+                yield n_thr, output
+            if bank is not None:
+                self.dynamics.set_case_uncertainties(None, None, None)
+
+    def run_tasks(self, x0, banks, seed, n_thrusters, cases, n_workers, record, pool):
+        """
+        Propagate the cases of each number of engines by chunks of at most MAX_BATCH_CASES with run_task, in the
+        process pool if there is more than one worker, or with the worker_dynamics of this process.
+
+        :param x0: initial state of each case, or None for the states of the scenario bank
+        :param banks: dict of the scenario bank by number of engines
+        :param cases: indexes of the cases to propagate
+        :return: generator of the number of engines and the output of each case, in order
+        """
+        # Chunks of cases of each number of engines, to have some tasks by worker
+        n_chunk = min(len(cases), max(int(np.ceil(4 * n_workers / len(n_thrusters))),
+                                      int(np.ceil(len(cases) / MAX_BATCH_CASES))))
+        chunks = np.array_split(cases, n_chunk)
+        tasks = []
+        for n_thr in n_thrusters:
+            bank = banks[n_thr]
+            for chunk in chunks:
+                case_values = None if bank is None else [bank.get_case_values(k) for k in chunk]
+                tasks.append((n_thr, chunk.tolist(), (x0 if bank is None else bank.x0)[chunk], self.xf,
+                              self.time_options, seed, record, case_values))
+        if pool is not None:
+            for task, task_output in zip(tasks, pool.imap(run_task, tasks)):
+                for output in task_output:
+                    yield task[0], output
+        else:
+            for task in tasks:
+                # The tasks seed the global random state, it is restored after each one
+                rng_state = np.random.get_state()
+                task_output = run_task(task)
+                np.random.set_state(rng_state)
+                for output in task_output:
+                    yield task[0], output
+
+    def estimate_failure_probability(self, n_thr, velocity_limit, state_noise=None, n_sample=100, n_final=None,
+                                     max_level=10, rho=0.1, confidence=0.95, n_workers=None, seed=None):
+        """
+        Probability of a landing speed higher than velocity_limit [m/s] with n_thr engines, estimated with
+        cross-entropy importance sampling (see CrossEntropySampler): levels of n_sample cases move the sampling
+        distribution of the initial state, Isp bias and dead time to the failure region, up to max_level levels, and
+        the estimate is the weighted mean of the failures of n_final cases drawn from the last distribution.
+
+        :param n_workers: number of processes of the tasks of the cases, as in evaluate
+        :param seed: seed of the sampler and of the Isp noise of the cases. If None, it is drawn from the global random
+            state.
+        :return: dict of the probability, its standard error and confidence interval, the number of levels and the
+            number of simulations
+        """
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+        n_final = n_sample if n_final is None else n_final
+        self.set_configuration(self.dynamics, n_thr)
+        state_std = None
+        if state_noise is not None and state_noise[0]:
+            state_std = state_noise[1:4]
+        sampler = CrossEntropySampler(self.x0, self.dynamics.thrusters, state_std, seed, rho)
+        pool = None
+        if n_workers is not None:
+            dynamics = {n_thr: deepcopy(self.dynamics)}
+            if n_workers > 1:
+                pool = multiprocessing.get_context('fork').Pool(n_workers, initializer=init_worker,
+                                                                initargs=(dynamics,))
+            else:
+                init_worker(dynamics)
+
+        n_simulation = 0
+        reached = False
+        while True:
+            final = reached or sampler.level >= max_level
+            n_case = n_final if final else n_sample
+            sampler.draw(n_case)
+            cases = np.arange(n_case)
+            if n_workers is not None:
+                level_seed = int(sampler.rng.integers(2 ** 31))
+                case_outputs = self.run_tasks(None, {n_thr: sampler}, level_seed, [n_thr], cases, n_workers, SUMMARY,
+                                              pool)
+            else:
+                case_outputs = self.run_cases(None, {n_thr: sampler}, None, [n_thr], cases, False, SUMMARY)
+            score = [abs(output['x_land'][1]) - velocity_limit for _, output in case_outputs]
+            n_simulation += n_case
+            if final:
+                break
+            reached = sampler.update(score)
+            print("Level ", sampler.level, ", threshold: ", sampler.threshold + velocity_limit, " [m/s]")
+        if pool is not None:
+            pool.close()
+            pool.join()
+        elif n_workers is not None:
+            init_worker(None)
+        probability, std_error, interval = sampler.get_estimate(score, confidence)
+        print("Failure probability: ", probability, " +/- ", std_error)
+        return {'probability': probability, 'std_error': std_error, 'interval': interval.tolist(),
+                'n_level': sampler.level, 'n_simulation': n_simulation}
+
+    def plot_results(self, performance_list, n_thrusters):
+        """
+        Plots of the evaluation: trajectories, state and landing distribution of each number of engines (if the
+        trajectories are saved, see evaluate), and landing statistics by number of engines.
+        """
+        for n_thr in n_thrusters:
+            if n_thr not in self.trajectories:
+                continue
+            X_states, TIME, THR, IC, EC, LAND_INDEX = self.trajectories[n_thr]
+            n_case = len(X_states)
+            pos_sim = [np.array(X_states[i])[:, 0] for i in range(n_case)]
+            vel_sim = [np.array(X_states[i])[:, 1] for i in range(n_case)]
+            mass_sim = [np.array(X_states[i])[:, 2] for i in range(n_case)]
+
+            plot_main_parameters(TIME, pos_sim, vel_sim, mass_sim, THR, IC, EC, save=False)
+            plot_state_vector(pos_sim, vel_sim, IC, EC, folder_name=self.folder_name,
                               file_name=self.file_name_2 + "_" + str(n_thr), save=True)
-            performance = plot_distribution(pos_sim, vel_sim, LAND_INDEX[i_n], folder_name=self.folder_name,
-                                            file_name=self.file_name_4 + "_" + str(n_thr), save=True)
-            performance_list.append(performance)
+            plot_distribution(pos_sim, vel_sim, LAND_INDEX, folder_name=self.folder_name,
+                              file_name=self.file_name_4 + "_" + str(n_thr), save=True)
             close_plot()
-            i_n += 1
         plot_performance(performance_list, max(n_thrusters), folder_name=self.folder_name, file_name=self.file_name_5,
                          save=True)
+        return
+
+    def propagate(self, n_case, n_thrusters, state_noise=None, batch_simulation=False):
+        performance_list = self.evaluate(n_case, n_thrusters, state_noise, batch_simulation, keep_trajectories=True)
+        self.plot_results(performance_list, n_thrusters)
         plt.show()
         return performance_list
 
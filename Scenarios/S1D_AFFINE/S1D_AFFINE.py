@@ -18,7 +18,7 @@ from Dynamics.Dynamics import Dynamics
 from Thrust.PropellantGrain import propellant_data
 from tools.Viewer import *
 from Evaluation import Evaluation
-from tools.ext_requirements import save_data
+from tools.ext_requirements import save_data, save_checkpoint_data, load_checkpoint_data
 
 if os.path.isdir("./logs/") is False:
     os.mkdir("./logs/")
@@ -36,7 +36,22 @@ now = now.strftime("%Y-%m-%dT%H-%M-%S")
 reference_frame = '1D'
 
 
-def s1d_affine(propellant_geometry, type_problem, r0_, v0_, std_alt_, std_vel_, n_case, n_thrusters_, save_plot=True):
+def s1d_affine(propellant_geometry, type_problem, r0_, v0_, std_alt_, std_vel_, n_case, n_thrusters_, save_plot=True,
+               batch_simulation=True, n_workers=None, stagnation_generations=None, checkpoint_file=None,
+               optimizer=None, steady_state=False, n_case_eval=60, eval_tolerance=None):
+    """
+    :param optimizer: optimizer of the engine and controller parameters (CMAES or DifferentialEvolution), or None for
+        the operators of the genetic algorithm (see GeneticAlgorithm)
+    :param steady_state: if True, the genetic algorithm evaluates the individuals asynchronously in the n_workers,
+        without batch simulation (see GeneticAlgorithm.run_steady_state)
+    :param n_case_eval: number of cases of the evaluation of each number of engines, the maximum with eval_tolerance
+    :param eval_tolerance: maximum half width [m/s] of the confidence intervals of the mean and std of the landing
+        velocity of the evaluation, which adds cases until it is reached (see Evaluation.evaluate), or None
+    :param checkpoint_file: file (.npz) to save the results after each number of engines, and the state of the
+        genetic algorithm of each number of engines in '<checkpoint_file name>_<n_engines>_ga.npz' (see
+        GeneticAlgorithm.save_checkpoint). If the files exist, the interrupted run continues from them with the same
+        results.
+    """
     # -----------------------------------------------------------------------------------------------------#
     # Data Mars lander (12U (24 kg), 27U (54 kg))
     m0 = 24
@@ -215,6 +230,17 @@ def s1d_affine(propellant_geometry, type_problem, r0_, v0_, std_alt_, std_vel_,
         rate_time = max(time_ser) / t_free
         return Ah * error_pos ** 2 + Bh * error_vel ** 2 + rate_time * 10
 
+    def sp_summary_cost_function(ga_summary, Ah, Bh):
+        # Same cost as sp_cost_function with the summary of the simulation (record='summary')
+        error_pos = ga_summary['x_land'][0] - xf[0]
+        error_vel = ga_summary['x_land'][1] - xf[1]
+        if ga_summary['max_vel'] > 0:
+            error_vel *= 10
+        if ga_summary['min_alt'] < 0:
+            error_pos *= 100
+        rate_time = ga_summary['final_time'] / t_free
+        return Ah * error_pos ** 2 + Bh * error_vel ** 2 + rate_time * 10
+
     json_list = {}
     file_name_1 = type_propellant[:3] + "_Out_data"
     file_name_2 = type_propellant[:3] + "_state"
@@ -224,8 +250,18 @@ def s1d_affine(propellant_geometry, type_problem, r0_, v0_, std_alt_, std_vel_,
     json_list['N_case'] = n_case
     performance_list = []
     folder_name = "Only_GA_" + str(type_problem) + "/" + type_propellant + "/" + now + "/"
+    done_thrusters = []
+    if checkpoint_file is not None and os.path.isfile(checkpoint_file):
+        checkpoint = load_checkpoint_data(checkpoint_file)
+        json_list = json.loads(str(checkpoint['json_list']))
+        performance_list = checkpoint['performance_list'].tolist()
+        folder_name = str(checkpoint['folder_name'])
+        done_thrusters = checkpoint['done_thrusters'].tolist()
+        print('Resume from checkpoint, done engines: ', done_thrusters)
 
     for n_thr in n_thrusters:
+        if n_thr in done_thrusters:
+            continue
         print('N thrust: ', n_thr)
         json_list[str(n_thr)] = {}
         pulse_thruster = int(n_thr / par_force)
@@ -240,20 +276,26 @@ def s1d_affine(propellant_geometry, type_problem, r0_, v0_, std_alt_, std_vel_,
         # if type_propellant != NEUTRAL:
         #     t_burn_max = (space_max / np.sqrt(n_thr) / thickness_case_factor) / 30 * 8.0
 
+        ga_checkpoint_file = None
+        if checkpoint_file is not None:
+            ga_checkpoint_file = os.path.splitext(checkpoint_file)[0] + '_' + str(n_thr) + '_ga.npz'
         ga = GeneticAlgorithm(max_generation=300, n_individuals=40,
                               ranges_variable=[['float', alpha_min, alpha_max, pulse_thruster],
                                                ['float', 0.0, t_burn_max, pulse_thruster], ['str', type_propellant],
                                                ['float_iter', 0.0, 1.0, pulse_thruster],
                                                ['float_iter', 0.0, x0[0] / np.sqrt(2 * np.abs(g_center_body) * x0[0]),
                                                 pulse_thruster]],
-                              mutation_probability=0.25)
+                              mutation_probability=0.25, batch_simulation=batch_simulation, n_workers=n_workers,
+                              stagnation_generations=stagnation_generations,
+                              checkpoint_file=ga_checkpoint_file, optimizer=optimizer, steady_state=steady_state)
 
         start_time = time.time()
         best_states, best_time_data, best_Tf, best_individuals, index_control, end_index_control, land_index = ga.optimize(
             cost_function=sp_cost_function, n_case=n_case, restriction_function=[dynamics, x0, xf, time_options,
                                                                                  propellant_properties,
                                                                                  thruster_properties],
-            alt_noise=state_noise)
+            alt_noise=state_noise, summary_cost_function=sp_summary_cost_function,
+            resume=ga_checkpoint_file is not None and os.path.isfile(ga_checkpoint_file))
 
         finish_time = time.time()
         print('Time to optimize: ', finish_time - start_time, '[s]')
@@ -273,6 +315,7 @@ def s1d_affine(propellant_geometry, type_problem, r0_, v0_, std_alt_, std_vel_,
             json_list[str(n_thr)]['Case' + str(k)]['response'] = df
             json_list[str(n_thr)]['Case' + str(k)]['cost'] = df_cost
 
+        json_list[str(n_thr)]['termination'] = ga.termination
         json_list[str(n_thr)]['Best_individual'] = [best_individuals[0], best_individuals[1], best_individuals[3],
                                                     best_individuals[4]]
         print('Best individual for ', n_thr, 'engines')
@@ -299,6 +342,14 @@ def s1d_affine(propellant_geometry, type_problem, r0_, v0_, std_alt_, std_vel_,
                           folder_name=folder_name, file_name=file_name_2 + "_" + str(n_thr))
 
         close_plot()
+        if checkpoint_file is not None:
+            done_thrusters.append(n_thr)
+            save_checkpoint_data(checkpoint_file, json_list=json.dumps(json_list),
+                                 performance_list=np.array(performance_list), folder_name=folder_name,
+                                 done_thrusters=np.array(done_thrusters))
+            if os.path.isfile(ga_checkpoint_file):
+                # The steady-state mode does not save the state of the genetic algorithm
+                os.remove(ga_checkpoint_file)
 
     save_data(json_list, folder_name, file_name_1)
     plot_performance(performance_list, max(n_thrusters), save=save_plot, folder_name=folder_name,
@@ -335,16 +386,20 @@ def s1d_affine(propellant_geometry, type_problem, r0_, v0_, std_alt_, std_vel_,
     percentage_variation = 10
     upper_isp = Isp * (1.0 + percentage_variation / 100.0)
     propellant_properties['isp_bias_std'] = (upper_isp - Isp) / 3
-    n_case_eval = 60
     evaluation = Evaluation(dynamics, x0, xf, time_options, json_list, control_function, thruster_properties,
                             propellant_properties,
                             type_propellant, folder_name)
-    eva_performance = evaluation.propagate(n_case_eval, n_thrusters, state_noise=[True, std_alt_, std_vel_, 0.0])
+    eva_performance = evaluation.evaluate(n_case_eval, n_thrusters, state_noise=[True, std_alt_, std_vel_, 0.0],
+                                          batch_simulation=batch_simulation, n_workers=n_workers,
+                                          keep_trajectories=save_plot, tolerance=eval_tolerance)
+    if save_plot:
+        evaluation.plot_results(eva_performance, n_thrusters)
 
     json_perf = {'mean_pos': np.array(eva_performance)[:, 0].tolist(),
                  'mean_vel': np.array(eva_performance)[:, 1].tolist(),
                  'std_pos': np.array(eva_performance)[:, 2].tolist(),
-                 'std_vel': np.array(eva_performance)[:, 3].tolist()}
+                 'std_vel': np.array(eva_performance)[:, 3].tolist(),
+                 'n_case': [evaluation.n_case_used[n_thr] for n_thr in n_thrusters]}
     save_data(json_perf, folder_name, "eva_" + type_propellant[:3] + "_performance_data")
     print("Finished")
 
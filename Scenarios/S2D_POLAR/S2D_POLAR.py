@@ -0,0 +1,184 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 2:40 PM
+els.obrq@gmail.com
+
+"""
+import time
+
+from datetime import datetime
+from tools.ext_requirements import velocity_req, mass_req
+from Dynamics.Dynamics import Dynamics
+from Thrust.PropellantGrain import propellant_data
+from tools.MonteCarlo import MonteCarlo
+from tools.Viewer import *
+from tools.ext_requirements import save_data
+
+if os.path.isdir("./logs/") is False:
+    os.mkdir("./logs/")
+
+NEUTRAL = 'neutral'
+PROGRESSIVE = 'progressive'
+REGRESSIVE = 'regressive'
+
+now = datetime.now()
+now = now.strftime("%Y-%m-%dT%H-%M-%S")
+reference_frame = 'polar'
+
+
+def s2d_polar(propellant_geometry, type_problem, h_perilune, h_apolune, std_alt_, std_vel_, n_case, n_thrusters_,
+              time_to_go, save_plot=True):
+    """
+    Landing from the perilune of a descent orbit in the polar reference frame. All the cases are propagated in one
+    batch (Dynamics.run_simulation_batch), the engine j is fired when h / |V| <= time_to_go[j] and the thrust is
+    pointed against the velocity (Dynamics.polar_affine_control).
+    """
+    # -----------------------------------------------------------------------------------------------------#
+    # Data Mars lander (12U (24 kg), 27U (54 kg))
+    m0 = 24
+    propellant_name = 'TRX-H609'
+    selected_propellant = propellant_data[propellant_name]
+    Isp = selected_propellant['Isp']
+    den_p = selected_propellant['density']
+    ge = 9.807
+    c_char = Isp * ge
+
+    # -----------------------------------------------------------------------------------------------------#
+    # Center body data
+    # Moon
+    g_center_body = -1.62
+    r_moon = 1738e3
+    mu = 4.9048695e12
+
+    # -----------------------------------------------------------------------------------------------------#
+    # Descent orbit
+    rp = r_moon + h_perilune
+    ra = r_moon + h_apolune
+    a_orbit = 0.5 * (rp + ra)
+    vp = np.sqrt(mu * (2 / rp - 1 / a_orbit))
+    va = np.sqrt(mu * (2 / ra - 1 / a_orbit))
+
+    # Target localization
+    rd = r_moon
+    vd = 0
+
+    # -----------------------------------------------------------------------------------------------------#
+    # Initial requirements for 2D
+    print('--------------------------------------------------------------------------')
+    print('2D requirements')
+    dv_req_p, dv_req_a = velocity_req(vp, va, r_moon, mu, rp, ra)
+    mp, m1 = mass_req(dv_req_p, c_char, den_p, m0)
+
+    # -----------------------------------------------------------------------------------------------------#
+    # Simulation time
+    dt = 0.1
+    simulation_time = 3000
+    # -----------------------------------------------------------------------------------------------------#
+    # System Propulsion properties
+    t_burn = 30  # s
+    par_force = 1  # Engines working simultaneously
+    pulse_thruster = int(n_thrusters_ / par_force)
+    max_fuel_mass = 1.05 * mp
+    alpha = max_fuel_mass / pulse_thruster / t_burn
+    print('Mass flow rate by engine [kg/s]', alpha)
+    print('Max thrust by engine [N]', alpha * c_char)
+    print('--------------------------------------------------------------------------')
+
+    dynamics = Dynamics(dt, Isp, g_center_body, mu, r_moon, m0, reference_frame, controller='affine_function')
+    propellant_properties = {'propellant_name': propellant_name,
+                             'n_thrusters': n_thrusters_,
+                             'pulse_thruster': pulse_thruster,
+                             'geometry': None,
+                             'propellant_geometry': propellant_geometry,
+                             'isp_noise_std': None,
+                             'isp_bias_std': None,
+                             'isp_dead_time_max': 0}
+    if type_problem in ['isp_noise', 'isp_bias-noise', 'all']:
+        percentage_variation = 3
+        upper_isp = Isp * (1.0 + percentage_variation / 100.0)
+        propellant_properties['isp_noise_std'] = (upper_isp - Isp) / 3
+    if type_problem in ['isp_bias', 'isp_bias-noise', 'all']:
+        percentage_variation = 10
+        upper_isp = Isp * (1.0 + percentage_variation / 100.0)
+        propellant_properties['isp_bias_std'] = (upper_isp - Isp) / 3
+        propellant_properties['isp_dead_time_max'] = 0.5
+
+    thruster_properties = {'throat_diameter': 2,
+                           'engine_diameter_ext': None,
+                           'height': 10.0,
+                           'performance': {'alpha': alpha,
+                                           't_burn': t_burn},
+                           'load_thrust_profile': False,
+                           'file_name': None,
+                           'dead_time': 0.2,
+                           'lag_coef': 0.5}
+    dynamics.set_engines_properties(thruster_properties, propellant_properties, propellant_geometry)
+    # a * h - b * |V| <= 0, with a = 1 the engine is fired when h / |V| <= b
+    dynamics.set_controller_parameters([[1.0] * pulse_thruster, time_to_go])
+
+    # initial condition: [r, v, theta, omega, m]
+    x0 = [rp, 0.0, 0.0, float(vp / rp), m0]
+    time_options = [0.0, simulation_time, dt]
+    xf = [rd, vd, 0.0, 0.0, 0.0]
+
+    print("Initial condition: ", str(x0))
+    print("N° case: ", n_case)
+    print("Type of propellant: ", propellant_geometry)
+    print("Type of problem: ", type_problem)
+    case_x0 = np.zeros((n_case, 5)) + x0
+    if type_problem in ['state_noise', 'all']:
+        case_x0[:, 0] = MonteCarlo(rp, std_alt_, n_case).random_value()
+        case_x0[:, 1] = MonteCarlo(0.0, std_vel_, n_case).random_value()
+        case_x0[:, 3] = MonteCarlo(vp, std_vel_, n_case).random_value() / rp
+
+    start_time = time.time()
+    x_states, time_series, thr, index_control, end_index_control, land_index = \
+        dynamics.run_simulation_batch(case_x0, xf, time_options)
+    print('Time to propagate: ', time.time() - start_time, '[s]')
+
+    engine = dynamics.get_batch_engine_parameters()
+    alt = [x_states[k][:, 0] - r_moon for k in range(n_case)]
+    vel = [x_states[k][:, 1] for k in range(n_case)]
+    vel_t = [x_states[k][:, 0] * x_states[k][:, 3] for k in range(n_case)]
+
+    json_list = {'N_case': n_case}
+    folder_name = "Polar_" + str(type_problem) + "/" + propellant_geometry + "/" + now + "/"
+    file_name_1 = propellant_geometry[:3] + "_Out_data"
+    file_name_2 = propellant_geometry[:3] + "_state"
+    file_name_4 = propellant_geometry[:3] + "_distribution"
+    for k in range(n_case):
+        psi = dynamics.polar_affine_control(x_states[k], engine)[1]
+        json_list['Case' + str(k)] = {'response': {'Time[s]': time_series[k].tolist(), 'Alt[m]': alt[k].tolist(),
+                                                   'V[m/s]': vel[k].tolist(), 'Vt[m/s]': vel_t[k].tolist(),
+                                                   'theta[rad]': x_states[k][:, 2].tolist(),
+                                                   'mass[kg]': x_states[k][:, 4].tolist(),
+                                                   'T[N]': thr[k].tolist(), 'psi[rad]': psi.tolist()}}
+    final_vel_t = [vel_t[k][land_index[k]] for k in range(n_case)]
+    print('Tangential velocity at landing: (mean, std) [m/s]', np.mean(final_vel_t), np.std(final_vel_t))
+
+    performance = plot_distribution(alt, vel, land_index, folder_name, file_name_4, save=save_plot)
+    json_list['performance'] = {'mean_pos': performance[0],
+                                'mean_vel': performance[1],
+                                'std_pos': performance[2],
+                                'std_vel': performance[3],
+                                'mean_vel_t': np.mean(final_vel_t),
+                                'std_vel_t': np.std(final_vel_t)}
+    plot_state_vector(alt, vel, index_control, end_index_control, save=save_plot, folder_name=folder_name,
+                      file_name=file_name_2)
+    close_plot()
+    save_data(json_list, folder_name, file_name_1)
+    print("Finished")
+
+
+if __name__ == '__main__':
+    h_perilune_, h_apolune_, std_alt_, std_vel_, n_case_, n_thrusters_ = 15e3, 100e3, 50.0, 1.0, 50, 10
+    time_to_go_ = [9.0, 8.5, 8.0, 7.5, 7.0, 6.5, 6.0, 5.0, 4.0, 3.0]
+
+    # Problem: "isp_noise"-"isp_bias"-"isp_bias-noise"-"state_noise"-"all"
+
+    type_problem = "all"
+    propellant_geometry = NEUTRAL
+    s2d_polar(propellant_geometry, type_problem, h_perilune_, h_apolune_, std_alt_, std_vel_, n_case_, n_thrusters_,
+              time_to_go_)
@@ -62,6 +62,11 @@ class PropellantGrain(GeometryGrain):
             self.dead_time = 0
         self.current_dead_time   = 0
         self.c_char              = self.isp0 * ge
+        # Values of a case given by a scenario bank (see set_case_values), used instead of the random draws
+        self.case_isp_bias       = None
+        self.case_isp_noise      = None
+        self.case_dead_time      = None
+        self.n_noise             = 0
         self.r_gases             = R_g / self.selected_propellant['molecular_weight']
         self.small_gamma         = self.selected_propellant['small_gamma']
         self.big_gamma           = self.calc_big_gamma()
@@ -78,21 +83,43 @@ class PropellantGrain(GeometryGrain):
 
     def get_update_noise_isp(self):
         if self.std_noise is not None:
-            noise_isp = np.random.normal(0, self.std_noise)
+            if self.case_isp_noise is None:
+                noise_isp = np.random.normal(0, self.std_noise)
+            else:
+                noise_isp = self.case_isp_noise[min(self.n_noise, len(self.case_isp_noise) - 1)]
+                self.n_noise += 1
             return self.c_char + noise_isp * ge
         else:
             return self.c_char
 
     def update_bias_isp(self):
         if self.std_bias is not None:
-            isp = np.random.normal(self.isp0, self.std_bias)
+            isp = np.random.normal(self.isp0, self.std_bias) if self.case_isp_bias is None else self.case_isp_bias
             self.c_char = isp * ge
 
+    def set_case_values(self, isp_bias, isp_noise, dead_time):
+        """
+        Values of the next case: Isp bias [s], Isp noise [s] of each burn step and dead time [s]. None to go back
+        to the random draws.
+        """
+        self.case_isp_bias = isp_bias
+        self.case_isp_noise = isp_noise
+        self.case_dead_time = dead_time
+        self.n_noise = 0
+        if dead_time is not None:
+            self.dead_time = dead_time
+            self.current_dead_time = 0.0
+        return
+
     def get_dead_time(self):
         return self.dead_time
 
     def update_dead_time(self):
-        self.dead_time = np.random.uniform(0, self.max_dead_time)
+        if self.case_dead_time is None:
+            self.dead_time = np.random.uniform(0, self.max_dead_time)
+        else:
+            self.dead_time = self.case_dead_time
+        self.n_noise = 0
         # print(self.dead_time)
         self.current_dead_time = 0.0
         return
@@ -7,6 +7,7 @@ email: els.obrq@gmail.com
 
 import numpy as np
 import pandas as pd
+from collections import OrderedDict
 from Thrust.PropellantGrain import PropellantGrain
 
 DEG2RAD = np.pi/180
@@ -18,6 +19,10 @@ STAR    = 'star'
 PROGRESSIVE = 'progressive'
 REGRESSIVE = 'regressive'
 
+# Normalized thrust tables of the lagged models by (burn_type, t_burn, dead_time, lag_coef, dt), with LRU eviction
+SHAPE_TABLE_SIZE = 512
+shape_tables = OrderedDict()
+
 
 class Thruster(object):
     def __init__(self, dt, thruster_properties, propellant_properties, burn_type=None):
@@ -50,6 +55,8 @@ class Thruster(object):
         self.lag_coef = 0.00
         self.dead_time = 0.0
         self.current_beta = 0
+        self.n_burn_step = 0
+        self.thrust_shape = None
 
         # variable for model the tanh function
         self.dx = 1
@@ -92,6 +99,7 @@ class Thruster(object):
         self.thr_is_on = False
         self.current_beta = 0
         self.current_burn_time = 0
+        self.n_burn_step = 0
         self.current_time = 0
         self.current_mag_thrust_c = 0
         self.thr_is_burned = False
@@ -105,21 +113,14 @@ class Thruster(object):
             self.calc_parametric_thrust()
         else:
             """Propagate thrust by model"""
-            if self.burn_type == PROGRESSIVE:
-                if self.lag_coef == 0.0:
-                    self.get_progressive_thrust()
-                else:
-                    self.get_progressive_thrust_with_lag()
+            if self.lag_coef != 0.0:
+                self.get_thrust_with_lag()
+            elif self.burn_type == PROGRESSIVE:
+                self.get_progressive_thrust()
             elif self.burn_type == REGRESSIVE:
-                if self.lag_coef == 0.0:
-                    self.get_regressive_thrust()
-                else:
-                    self.get_regressive_thrust_with_lag()
+                self.get_regressive_thrust()
             else:
-                if self.lag_coef == 0.0:
-                    self.get_neutral_thrust()
-                else:
-                    self.get_neutral_thrust_with_lag()
+                self.get_neutral_thrust()
         return
 
     def get_progressive_thrust(self):
@@ -173,29 +174,31 @@ class Thruster(object):
             self.current_mag_thrust_c = 0
             self.current_time += self.step_width
 
-    def calc_tanh_model(self, to):
+    def calc_tanh_model(self, to, burn_time=None):
+        if burn_time is None:
+            burn_time = self.current_burn_time
         if to == 'rising':
-            return (1 + np.tanh((self.current_burn_time / self.dead_time - self.g_displacer_point) * self.incline)) * 0.5
+            return (1 + np.tanh((burn_time / self.dead_time - self.g_displacer_point) * self.incline)) * 0.5
         elif to == 'decaying':
-            return (1 + np.tanh((-self.g_displacer_point - (self.current_burn_time - self.t_burn - 2 * self.dead_time)
+            return (1 + np.tanh((-self.g_displacer_point - (burn_time - self.t_burn - 2 * self.dead_time)
                                  / self.dead_time) * self.incline)) * 0.5
 
-    def get_neutral_thrust_with_lag(self):
+    def get_thrust_with_lag(self):
+        # Neutral, progressive and regressive thrust with lag. The normalized thrust of each burn step is taken from
+        # the table of get_thrust_shape_table, only the Isp is updated by step
         if self.thr_is_on:
             if self.current_burn_time == 0:
                 self.selected_propellant.update_bias_isp()
                 self.current_mag_thrust_c = 0
                 self.current_burn_time += self.step_width
-            elif self.current_burn_time <= self.dead_time + self.t_burn/2:
-                current_max_thrust = self.current_alpha * self.selected_propellant.get_update_noise_isp()
-                self.current_mag_thrust_c = current_max_thrust * self.calc_tanh_model('rising')
-                self.current_time += self.step_width
-                self.current_burn_time += self.step_width
-            elif self.lag_coef + self.dead_time + self.t_burn >= self.current_burn_time: #> self.dead_time + self.t_burn/2:
+                self.thrust_shape = self.get_thrust_shape_table()
+                self.n_burn_step = 1
+            elif self.n_burn_step < len(self.thrust_shape):
                 current_max_thrust = self.current_alpha * self.selected_propellant.get_update_noise_isp()
-                self.current_mag_thrust_c = current_max_thrust * self.calc_tanh_model('decaying')
+                self.current_mag_thrust_c = current_max_thrust * self.thrust_shape[self.n_burn_step]
                 self.current_time += self.step_width
                 self.current_burn_time += self.step_width
+                self.n_burn_step += 1
             else:
                 self.current_mag_thrust_c = 0
                 self.thr_is_burned = True
@@ -204,63 +207,51 @@ class Thruster(object):
             self.current_mag_thrust_c = 0
             self.current_time += self.step_width
 
-    def get_regressive_thrust_with_lag(self):
-        if self.thr_is_on:
-            if self.current_burn_time == 0:
-                self.selected_propellant.update_bias_isp()
-                self.current_mag_thrust_c = 0
-                self.current_burn_time += self.step_width
-            elif self.current_burn_time <= self.dead_time + self.lag_coef:
-                current_max_thrust = self.current_alpha * self.selected_propellant.get_update_noise_isp()
-                self.current_mag_thrust_c = current_max_thrust * self.calc_tanh_model('rising')
-                self.current_burn_time += self.step_width
-                self.current_time += self.step_width
-            elif self.current_burn_time <= self.time_reg_intersection:
-                current_max_thrust = self.current_alpha * self.selected_propellant.get_update_noise_isp()
-                self.current_mag_thrust_c = current_max_thrust * (self.slope_reg * self.current_burn_time + self.c_reg)
-                self.current_time += self.step_width
-                self.current_burn_time += self.step_width
-            elif self.current_burn_time <= self.dead_time + self.t_burn + self.lag_coef:
-                current_max_thrust = self.current_alpha * self.selected_propellant.get_update_noise_isp()
-                self.current_mag_thrust_c = current_max_thrust * self.calc_tanh_model('decaying')
-                self.current_time += self.step_width
-                self.current_burn_time += self.step_width
-            else:
-                self.current_mag_thrust_c = 0
-                self.thr_is_burned = True
-                self.current_time += self.step_width
+    def calc_normalized_thrust(self, burn_time):
+        # Normalized thrust of the models with lag (rising, linear and decaying phases), None after the burn
+        if self.burn_type == PROGRESSIVE:
+            if burn_time <= self.time_pro_intersection:
+                return self.calc_tanh_model('rising', burn_time)
+            elif burn_time <= self.dead_time + self.t_burn - self.lag_coef:
+                return self.slope_pro * burn_time + self.c_pro
+            elif burn_time <= self.dead_time + self.t_burn + self.lag_coef:
+                return self.calc_tanh_model('decaying', burn_time)
+        elif self.burn_type == REGRESSIVE:
+            if burn_time <= self.dead_time + self.lag_coef:
+                return self.calc_tanh_model('rising', burn_time)
+            elif burn_time <= self.time_reg_intersection:
+                return self.slope_reg * burn_time + self.c_reg
+            elif burn_time <= self.dead_time + self.t_burn + self.lag_coef:
+                return self.calc_tanh_model('decaying', burn_time)
         else:
-            self.current_mag_thrust_c = 0
-            self.current_time += self.step_width
-
-    def get_progressive_thrust_with_lag(self):
-        if self.thr_is_on:
-            if self.current_burn_time == 0:
-                self.selected_propellant.update_bias_isp()
-                self.current_mag_thrust_c = 0
-                self.current_burn_time += self.step_width
-            elif self.current_burn_time <= self.time_pro_intersection:
-                current_max_thrust = self.current_alpha * self.selected_propellant.get_update_noise_isp()
-                self.current_mag_thrust_c = current_max_thrust * self.calc_tanh_model('rising')
-                self.current_burn_time += self.step_width
-                self.current_time += self.step_width
-            elif self.current_burn_time <= self.dead_time + self.t_burn - self.lag_coef:
-                current_max_thrust = self.current_alpha * self.selected_propellant.get_update_noise_isp()
-                self.current_mag_thrust_c = current_max_thrust * (self.slope_pro * self.current_burn_time + self.c_pro)
-                self.current_time += self.step_width
-                self.current_burn_time += self.step_width
-            elif self.current_burn_time <= self.dead_time + self.t_burn + self.lag_coef:
-                current_max_thrust = self.current_alpha * self.selected_propellant.get_update_noise_isp()
-                self.current_mag_thrust_c = current_max_thrust * self.calc_tanh_model('decaying')
-                self.current_time += self.step_width
-                self.current_burn_time += self.step_width
-            else:
-                self.current_mag_thrust_c = 0
-                self.thr_is_burned = True
-                self.current_time += self.step_width
-        else:
-            self.current_mag_thrust_c = 0
-            self.current_time += self.step_width
+            if burn_time <= self.dead_time + self.t_burn/2:
+                return self.calc_tanh_model('rising', burn_time)
+            elif self.lag_coef + self.dead_time + self.t_burn >= burn_time:
+                return self.calc_tanh_model('decaying', burn_time)
+        return None
+
+    def get_thrust_shape_table(self):
+        """
+        Normalized thrust of each burn step (the element n is the thrust after n steps of burn time), cached by
+        burn_type, t_burn, dead_time, lag_coef and step_width. The burn time is added step by step as in
+        get_thrust_with_lag, so the values are the same as the evaluation of the model at each step.
+        """
+        key = (self.burn_type, self.t_burn, self.dead_time, self.lag_coef, self.step_width)
+        if key in shape_tables:
+            shape_tables.move_to_end(key)
+            return shape_tables[key]
+        table = [0.0]
+        burn_time = 0
+        while True:
+            burn_time += self.step_width
+            shape = self.calc_normalized_thrust(burn_time)
+            if shape is None:
+                break
+            table.append(shape)
+        shape_tables[key] = tuple(table)
+        if len(shape_tables) > SHAPE_TABLE_SIZE:
+            shape_tables.popitem(last=False)
+        return shape_tables[key]
 
     def set_beta(self, beta, n_engine=0):
         if self.thr_is_burned:
@@ -0,0 +1,247 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 11:10 AM
+els.obrq@gmail.com
+
+"""
+import numpy as np
+from Thrust.Thruster import PROGRESSIVE, REGRESSIVE
+ge = 9.807
+
+
+class ThrusterBank(object):
+    """
+    Engines of a list of Thruster as arrays (n_engine,), to update the ignition and the thrust of all the engines in
+    one vectorized step. The ignition uses the affine switching function a * h + b * v <= 0 (controller_function with
+    type_control='affine'), and the normalized thrust of each engine is taken from the tables of
+    Thruster.get_thrust_shape_table by burn step. The Isp bias and noise are drawn in the order of the engines, with
+    the same values as the loop of Thruster objects. calc_thrust_shape writes the lagged thrust models as three phases
+    (rising, linear and decaying) limited by the burn times 'limit_1', 'limit_2' and 'limit_3', for continuous burn
+    times and different parameters by case.
+    """
+    def __init__(self, thrusters, controller_parameters):
+        self.thrusters = thrusters
+        self.n_engine = len(thrusters)
+        self.parameters = self.calc_parameters(thrusters, controller_parameters)
+        propellants = [thruster.selected_propellant for thruster in thrusters]
+        self.isp0 = np.array([propellant.isp0 for propellant in propellants], dtype=float)
+        self.std_bias = np.array([0.0 if propellant.std_bias is None else propellant.std_bias
+                                  for propellant in propellants])
+        self.std_noise = np.array([0.0 if propellant.std_noise is None else propellant.std_noise
+                                   for propellant in propellants])
+        self.has_bias = np.array([propellant.std_bias is not None for propellant in propellants])
+        self.has_noise = np.array([propellant.std_noise is not None for propellant in propellants])
+        self.ignition_dead_time = np.array([propellant.dead_time for propellant in propellants], dtype=float)
+        # Isp bias and noise of a scenario bank (see PropellantGrain.set_case_values)
+        self.case_values = any(propellant.case_isp_bias is not None or propellant.case_isp_noise is not None
+                               for propellant in propellants)
+        if self.case_values:
+            self.case_isp_bias = np.array([0.0 if propellant.case_isp_bias is None else propellant.case_isp_bias
+                                           for propellant in propellants])
+            noise = [[0.0] if propellant.case_isp_noise is None else propellant.case_isp_noise
+                     for propellant in propellants]
+            max_length = max(len(values) for values in noise)
+            self.case_isp_noise = np.array([np.pad(values, (0, max_length - len(values)), mode='edge')
+                                            for values in noise])
+            self.n_noise = np.array([propellant.n_noise for propellant in propellants], dtype=int)
+        # State of the engines
+        self.current_dead_time = np.array([propellant.current_dead_time for propellant in propellants], dtype=float)
+        self.c_char = np.array([propellant.c_char for propellant in propellants], dtype=float)
+        self.current_beta = np.array([thruster.current_beta == 1 for thruster in thrusters])
+        self.thr_is_on = np.array([thruster.thr_is_on for thruster in thrusters])
+        self.thr_is_burned = np.array([thruster.thr_is_burned for thruster in thrusters])
+        self.current_burn_time = np.array([thruster.current_burn_time for thruster in thrusters], dtype=float)
+        self.n_burn_step = np.array([thruster.n_burn_step for thruster in thrusters], dtype=int)
+        self.shape_table, self.table_length = self.get_shape_tables()
+        self.engine_index = np.arange(self.n_engine)
+        self.current_mag_thrust = np.zeros(self.n_engine)
+        self.any_on = bool(np.count_nonzero(self.thr_is_on))
+        self.idle = self.get_idle_engines()
+
+    def get_idle_engines(self):
+        # Switching parameters (a, b) of the engines without ignition
+        idle = np.flatnonzero(~self.current_beta)
+        return list(zip(self.parameters['a'][idle].tolist(), self.parameters['b'][idle].tolist()))
+
+    def get_shape_tables(self):
+        """
+        Normalized thrust of each engine by burn step (see Thruster.get_thrust_shape_table), as an array
+        (n_engine, max_length + 1) filled with zeros, and the length of the table of each engine.
+        """
+        tables = []
+        for j, thruster in enumerate(self.thrusters):
+            if thruster.lag_coef != 0.0:
+                tables.append(thruster.get_thrust_shape_table())
+                continue
+            # Constant thrust until t_burn
+            table = [0.0]
+            burn_time = 0
+            while burn_time + thruster.step_width <= thruster.t_burn:
+                burn_time += thruster.step_width
+                table.append(self.parameters['no_lag_value'][j])
+            tables.append(table)
+        table_length = np.array([len(table) for table in tables])
+        shape_table = np.zeros((self.n_engine, max(table_length) + 1))
+        for j, table in enumerate(tables):
+            shape_table[j, :len(table)] = table
+        return shape_table, table_length
+
+    @staticmethod
+    def is_supported(thrusters):
+        # The bank uses the thrust model, not the grain geometry or a loaded thrust profile. The values of a
+        # scenario bank must be given for all the engines with Isp bias or noise
+        propellants = [thruster.selected_propellant for thruster in thrusters]
+        case_values = [(propellant.std_bias is None or propellant.case_isp_bias is not None)
+                       and (propellant.std_noise is None or propellant.case_isp_noise is not None)
+                       for propellant in propellants if propellant.std_bias is not None
+                       or propellant.std_noise is not None]
+        if any(case_values) and not all(case_values):
+            return False
+        return all(thruster.selected_propellant.geometry_grain is None and thruster.thrust_profile is None
+                   for thruster in thrusters)
+
+    @staticmethod
+    def calc_parameters(thrusters, controller_parameters):
+        """
+        Parameters of each engine as arrays (n_engine,). 'dead_time' is the dead time of the lagged thrust model.
+        """
+        engine = {'alpha': [], 'c_char': [], 'dt': [], 'dt_dead': [], 'a': [], 'b': [], 't_burn': [],
+                  'dead_time': [], 'g_displacer_point': [], 'incline': [], 'slope': [], 'c': [],
+                  'limit_1': [], 'limit_2': [], 'limit_3': [], 'no_lag': [], 'no_lag_value': []}
+        for j, thruster in enumerate(thrusters):
+            engine['alpha'].append(thruster.current_alpha)
+            engine['c_char'].append(thruster.selected_propellant.get_c_char())
+            engine['dt'].append(thruster.step_width)
+            engine['dt_dead'].append(thruster.selected_propellant.dt)
+            engine['a'].append(controller_parameters[j][0])
+            engine['b'].append(controller_parameters[j][1])
+            engine['t_burn'].append(thruster.t_burn)
+            engine['no_lag'].append(thruster.lag_coef == 0.0)
+            if thruster.lag_coef == 0.0:
+                engine['no_lag_value'].append(0.0 if thruster.burn_type in [PROGRESSIVE, REGRESSIVE] else 1.0)
+                engine['dead_time'].append(1.0)
+                engine['g_displacer_point'].append(0.0)
+                engine['incline'].append(0.0)
+                engine['slope'].append(0.0)
+                engine['c'].append(0.0)
+                engine['limit_1'].append(thruster.t_burn)
+                engine['limit_2'].append(thruster.t_burn)
+                engine['limit_3'].append(thruster.t_burn)
+                continue
+            engine['no_lag_value'].append(0.0)
+            engine['dead_time'].append(thruster.dead_time)
+            engine['g_displacer_point'].append(thruster.g_displacer_point)
+            engine['incline'].append(thruster.incline)
+            if thruster.burn_type == PROGRESSIVE:
+                engine['slope'].append(thruster.slope_pro)
+                engine['c'].append(thruster.c_pro)
+                engine['limit_1'].append(thruster.time_pro_intersection)
+                engine['limit_2'].append(thruster.dead_time + thruster.t_burn - thruster.lag_coef)
+                engine['limit_3'].append(thruster.dead_time + thruster.t_burn + thruster.lag_coef)
+            elif thruster.burn_type == REGRESSIVE:
+                engine['slope'].append(thruster.slope_reg)
+                engine['c'].append(thruster.c_reg)
+                engine['limit_1'].append(thruster.dead_time + thruster.lag_coef)
+                engine['limit_2'].append(thruster.time_reg_intersection)
+                engine['limit_3'].append(thruster.dead_time + thruster.t_burn + thruster.lag_coef)
+            else:
+                engine['slope'].append(0.0)
+                engine['c'].append(0.0)
+                engine['limit_1'].append(thruster.dead_time + thruster.t_burn / 2)
+                engine['limit_2'].append(thruster.dead_time + thruster.t_burn / 2)
+                engine['limit_3'].append(thruster.lag_coef + thruster.dead_time + thruster.t_burn)
+        for key in engine.keys():
+            engine[key] = np.array(engine[key], dtype=bool if key == 'no_lag' else float)
+        return engine
+
+    @staticmethod
+    def calc_thrust_shape(engine, current_burn_time):
+        """
+        Normalized thrust for the current burn time of each engine (any shape that broadcasts with the parameters),
+        and the mask of the engines that are still burning.
+        """
+        cbt = current_burn_time
+        rising = (1 + np.tanh((cbt / engine['dead_time'] - engine['g_displacer_point']) * engine['incline'])) * 0.5
+        decaying = (1 + np.tanh((-engine['g_displacer_point'] - (cbt - engine['t_burn'] - 2 * engine['dead_time'])
+                                 / engine['dead_time']) * engine['incline'])) * 0.5
+        shape = np.where(cbt <= engine['limit_2'], engine['slope'] * cbt + engine['c'], decaying)
+        shape = np.where(cbt <= engine['limit_1'], rising, shape)
+        shape = np.where(engine['no_lag'], engine['no_lag_value'], shape)
+        return shape, cbt <= engine['limit_3']
+
+    def update(self, state, k, index_control, end_index_control):
+        """
+        Ignition (set_beta) and thrust (propagate_thr) of all the engines for the step k.
+
+        :return: total thrust, added in the order of the engines
+        """
+        engine = self.parameters
+        alt, vel = float(state[0]), float(state[1])
+        if not self.any_on:
+            # All the engines are off, the state only changes if the switching function of an idle engine is <= 0
+            for a, b in self.idle:
+                if a * alt + b * vel <= 0:
+                    break
+            else:
+                return 0
+        control_signal = engine['a'] * alt + engine['b'] * vel <= 0
+        new_index = control_signal & ~self.current_beta
+        index_control += [k] * np.count_nonzero(new_index)
+        end_index_control += [k - 1] * np.count_nonzero(self.thr_is_burned & self.thr_is_on)
+
+        # Set beta
+        ignition = new_index & ~self.thr_is_burned
+        ready = self.current_dead_time >= self.ignition_dead_time
+        np.add(self.current_dead_time, engine['dt_dead'], out=self.current_dead_time, where=ignition & ~ready)
+        self.thr_is_on |= ignition & ready
+        beta = self.current_beta.copy()
+        self.current_beta |= ignition & ready
+        self.current_beta &= self.thr_is_burned | control_signal | self.thr_is_on
+        self.thr_is_on &= ~self.thr_is_burned
+        if not np.array_equal(beta, self.current_beta):
+            self.idle = self.get_idle_engines()
+
+        # Propagate thrust
+        first_step = self.thr_is_on & (self.n_burn_step == 0)
+        shape = self.shape_table[self.engine_index, self.n_burn_step]
+        burning = self.thr_is_on & ~first_step & (self.n_burn_step < self.table_length)
+        draw_bias = first_step & self.has_bias
+        draw_noise = burning & self.has_noise
+        c_noise = self.c_char
+        n_draw = np.count_nonzero(draw_bias | draw_noise)
+        if self.case_values:
+            self.c_char = np.where(draw_bias, self.case_isp_bias * ge, self.c_char)
+            noise = self.case_isp_noise[self.engine_index, np.minimum(self.n_noise, self.case_isp_noise.shape[1] - 1)]
+            c_noise = np.where(draw_noise, self.c_char + noise * ge, self.c_char)
+            self.n_noise += draw_noise
+        elif n_draw > 0:
+            # One normal value by engine, in the order of the engines
+            values = np.zeros(self.n_engine)
+            values[draw_bias | draw_noise] = np.random.standard_normal(n_draw)
+            self.c_char = np.where(draw_bias, (self.isp0 + self.std_bias * values) * ge, self.c_char)
+            c_noise = np.where(draw_noise, self.c_char + self.std_noise * values * ge, self.c_char)
+        self.current_mag_thrust = np.where(burning, engine['alpha'] * c_noise * shape, 0.0)
+        self.thr_is_burned |= self.thr_is_on & ~first_step & ~burning
+        np.add(self.current_burn_time, engine['dt'], out=self.current_burn_time, where=first_step | burning)
+        self.n_burn_step += first_step | burning
+        self.any_on = bool(np.count_nonzero(self.thr_is_on))
+        return np.cumsum(self.current_mag_thrust)[-1]
+
+    def save_state(self):
+        # Copy the state of the engines to the Thruster objects
+        for j, thruster in enumerate(self.thrusters):
+            thruster.current_beta = int(self.current_beta[j])
+            thruster.thr_is_on = bool(self.thr_is_on[j])
+            thruster.thr_is_burned = bool(self.thr_is_burned[j])
+            thruster.current_burn_time = float(self.current_burn_time[j])
+            thruster.n_burn_step = int(self.n_burn_step[j])
+            if thruster.lag_coef != 0.0 and thruster.n_burn_step > 0:
+                thruster.thrust_shape = thruster.get_thrust_shape_table()
+            thruster.current_mag_thrust_c = float(self.current_mag_thrust[j])
+            thruster.selected_propellant.current_dead_time = float(self.current_dead_time[j])
+            thruster.selected_propellant.c_char = float(self.c_char[j])
+            if self.case_values:
+                thruster.selected_propellant.n_noise = int(self.n_noise[j])
+        return
@@ -0,0 +1,73 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 11:00 PM
+els.obrq@gmail.com
+
+"""
+import numpy as np
+
+
+class CMAES(object):
+    """
+    Covariance matrix adaptation evolution strategy in [0, 1]^n_genes, with the ask/tell interface of the optimizers
+    of GeneticAlgorithm: ask returns the whole population to evaluate and tell updates the distribution with the costs.
+    The samples out of the limits are clipped by GeneticAlgorithm, and the clipped genes are used in the update.
+    """
+    def __init__(self, n_genes, n_individuals, sigma=0.3, mean=None):
+        """
+        :param sigma: initial step size, in units of the range of the genes
+        :param mean: initial mean, or None for the center of the ranges
+        """
+        n = n_genes
+        self.n_genes = n_genes
+        self.n_individuals = n_individuals
+        self.sigma = sigma
+        self.mean = np.full(n, 0.5) if mean is None else np.array(mean, dtype=float)
+        self.mu = n_individuals // 2
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / np.sum(weights)
+        self.mu_eff = 1 / np.sum(self.weights ** 2)
+        self.cc = (4 + self.mu_eff / n) / (n + 4 + 2 * self.mu_eff / n)
+        self.cs = (self.mu_eff + 2) / (n + self.mu_eff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mu_eff)
+        self.cmu = min(1 - self.c1, 2 * (self.mu_eff - 2 + 1 / self.mu_eff) / ((n + 2) ** 2 + self.mu_eff))
+        self.damps = 1 + 2 * max(0, np.sqrt((self.mu_eff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.C = np.eye(n)
+        self.B = np.eye(n)
+        self.D = np.ones(n)
+        self.n_tell = 0
+
+    def ask(self):
+        z = np.random.normal(0, 1, size=(self.n_individuals, self.n_genes))
+        return self.mean + self.sigma * (z * self.D) @ self.B.T
+
+    def tell(self, genome, cost):
+        """
+        :param genome: array (n_individuals, n_genes) of the evaluated population
+        :param cost: cost of each individual
+        """
+        n = self.n_genes
+        self.n_tell += 1
+        selected = np.array(genome)[np.argsort(cost, kind='stable')[:self.mu]]
+        old_mean = self.mean
+        self.mean = self.weights @ selected
+        y_w = (self.mean - old_mean) / self.sigma
+        inv_sqrt_c = self.B @ np.diag(1 / self.D) @ self.B.T
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(self.cs * (2 - self.cs) * self.mu_eff) * inv_sqrt_c @ y_w
+        h_sigma = np.linalg.norm(self.ps) / np.sqrt(1 - (1 - self.cs) ** (2 * self.n_tell)) / self.chi_n \
+            < 1.4 + 2 / (n + 1)
+        self.pc = (1 - self.cc) * self.pc + h_sigma * np.sqrt(self.cc * (2 - self.cc) * self.mu_eff) * y_w
+        y = (selected - old_mean) / self.sigma
+        self.C = (1 - self.c1 - self.cmu) * self.C \
+            + self.c1 * (np.outer(self.pc, self.pc) + (1 - h_sigma) * self.cc * (2 - self.cc) * self.C) \
+            + self.cmu * (y.T * self.weights) @ y
+        self.sigma *= np.exp(self.cs / self.damps * (np.linalg.norm(self.ps) / self.chi_n - 1))
+        self.C = np.triu(self.C) + np.triu(self.C, 1).T
+        eigen_values, self.B = np.linalg.eigh(self.C)
+        self.D = np.sqrt(np.maximum(eigen_values, 1e-20))
+        return
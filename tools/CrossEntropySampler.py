@@ -0,0 +1,114 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/19/2026 1:10 AM
+els.obrq@gmail.com
+
+"""
+import numpy as np
+from scipy.stats import norm
+
+
+class CrossEntropySampler(object):
+    """
+    Importance sampling of the cases with the cross-entropy method, to estimate small failure probabilities. The
+    uncertainties of the cases (initial state, Isp bias and dead time of each engine) are standard normal variables z:
+    normal values are mu + sigma * z, and the dead time is max_dead_time * Phi(z). The Isp noise is drawn by the
+    propellants with its nominal distribution. The cases are drawn from the normal distribution of mean and std
+    (initially 0 and 1), which is moved to the failure region level by level (see update), and each case has the
+    likelihood ratio weight of the nominal distribution. The samples of the last draw are given as a scenario bank
+    (x0, isp_bias, dead_time and get_case_values, see ScenarioBank).
+    """
+    def __init__(self, x0, thrusters, state_std=None, seed=None, rho=0.1, smoothing=0.7):
+        """
+        :param x0: nominal initial state
+        :param thrusters: list of Thruster, to get the uncertainties of the propellants
+        :param state_std: standard deviation of each component of the initial state, or None
+        :param rho: fraction of the cases of higher score (elite) to fit the distribution of the next level
+        :param smoothing: weight of the new mean and std in the update of each level
+        """
+        self.rng = np.random.default_rng(seed)
+        self.nominal_x0 = np.array(x0, dtype=float)
+        self.x0 = np.zeros((0, len(x0)))
+        self.rho = rho
+        self.smoothing = smoothing
+        propellants = [thruster.selected_propellant for thruster in thrusters]
+        self.n_engine = len(propellants)
+        self.state_std = np.zeros(len(x0)) if state_std is None else np.array(state_std, dtype=float)
+        # Uncertain components of the state, and Isp bias and dead time of the engines
+        self.state_index = np.flatnonzero(self.state_std > 0)
+        self.isp0 = np.array([propellant.isp0 for propellant in propellants])
+        self.std_bias = None
+        if propellants[0].std_bias is not None:
+            self.std_bias = np.array([propellant.std_bias for propellant in propellants])
+        self.max_dead_time = None
+        if propellants[0].max_dead_time is not None:
+            self.max_dead_time = np.array([propellant.max_dead_time for propellant in propellants])
+        self.n_dim = len(self.state_index) + self.n_engine * ((self.std_bias is not None)
+                                                              + (self.max_dead_time is not None))
+        self.mean = np.zeros(self.n_dim)
+        self.std = np.ones(self.n_dim)
+        self.level = 0
+        self.threshold = -np.inf
+        self.z = np.zeros((0, self.n_dim))
+        self.log_weight = np.zeros(0)
+        self.isp_bias = None
+        self.dead_time = None
+
+    def draw(self, n_case):
+        """
+        Draw n_case cases from the distribution of the current level, with their initial states, Isp bias, dead time
+        and log weight.
+        """
+        self.z = self.mean + self.std * self.rng.standard_normal((n_case, self.n_dim))
+        self.log_weight = np.sum(norm.logpdf(self.z) - norm.logpdf(self.z, self.mean, self.std), axis=1)
+        z = self.z
+        self.x0 = np.zeros((n_case, len(self.nominal_x0))) + self.nominal_x0
+        n_state = len(self.state_index)
+        self.x0[:, self.state_index] += self.state_std[self.state_index] * z[:, :n_state]
+        z = z[:, n_state:]
+        if self.std_bias is not None:
+            self.isp_bias, z = self.isp0 + self.std_bias * z[:, :self.n_engine], z[:, self.n_engine:]
+        self.dead_time = np.zeros((n_case, self.n_engine))
+        if self.max_dead_time is not None:
+            self.dead_time = self.max_dead_time * norm.cdf(z[:, :self.n_engine])
+        return
+
+    def get_case_values(self, k):
+        # Isp bias, Isp noise (None, random draws of the propellants) and dead time of the engines for the case k
+        return None if self.isp_bias is None else self.isp_bias[k], None, self.dead_time[k]
+
+    def update(self, score):
+        """
+        Fit the distribution of the next level to the drawn cases with score higher than the (1 - rho) quantile of the
+        scores, limited by 0 (the failure threshold), with the weights of the cases. The std is not reduced below 1,
+        a narrower distribution than the nominal one gives weights of high variance in its tails.
+
+        :param score: score of each drawn case, a failure if it is higher than 0
+        :return: True if the threshold of the level is the failure threshold
+        """
+        score = np.array(score, dtype=float)
+        self.threshold = min(0.0, np.quantile(score, 1 - self.rho))
+        elite = score >= self.threshold
+        weight = np.exp(self.log_weight[elite] - np.max(self.log_weight[elite]))
+        weight /= np.sum(weight)
+        mean = weight @ self.z[elite]
+        std = np.sqrt(weight @ (self.z[elite] - mean) ** 2)
+        self.mean = self.smoothing * mean + (1 - self.smoothing) * self.mean
+        self.std = np.clip(self.smoothing * std + (1 - self.smoothing) * self.std, 1.0, None)
+        self.level += 1
+        return self.threshold >= 0.0
+
+    def get_estimate(self, score, confidence=0.95):
+        """
+        Unbiased estimate of the failure probability with the drawn cases of the final distribution.
+
+        :return: probability, standard error and normal confidence interval
+        """
+        value = np.exp(self.log_weight) * (np.array(score) > 0)
+        n = len(value)
+        probability = float(np.mean(value))
+        std_error = float(np.std(value, ddof=1) / np.sqrt(n)) if n > 1 else np.inf
+        z = norm.ppf(1 - (1 - confidence) / 2)
+        return probability, std_error, np.array([max(probability - z * std_error, 0.0), probability + z * std_error])
@@ -0,0 +1,57 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 11:00 PM
+els.obrq@gmail.com
+
+"""
+import numpy as np
+
+
+class DifferentialEvolution(object):
+    """
+    Differential evolution (rand/1/bin) in [0, 1]^n_genes, with the ask/tell interface of the optimizers of
+    GeneticAlgorithm. ask returns the trial vectors of the whole population, built with array operations, and tell
+    keeps each trial vector that does not have a higher cost than its target vector. The trial vector of the best
+    target vector is the target vector, so it is evaluated again with the cases of each generation.
+    """
+    def __init__(self, n_genes, n_individuals, differential_weight=0.7, crossover_probability=0.9):
+        self.n_genes = n_genes
+        self.n_individuals = n_individuals
+        self.differential_weight = differential_weight
+        self.crossover_probability = crossover_probability
+        self.population = None
+        self.cost = None
+        self.best_index = None
+
+    def ask(self):
+        n, n_genes = self.n_individuals, self.n_genes
+        if self.population is None:
+            return np.random.uniform(0, 1, size=(n, n_genes))
+        # Three different vectors r1, r2, r3 for each target vector, different of the target
+        others = np.argsort(np.random.uniform(size=(n, n - 1)), axis=1)[:, :3]
+        others += others >= np.arange(n)[:, None]
+        mutant = self.population[others[:, 0]] + self.differential_weight * (self.population[others[:, 1]]
+                                                                              - self.population[others[:, 2]])
+        crossover = np.random.uniform(size=(n, n_genes)) < self.crossover_probability
+        crossover[np.arange(n), np.random.randint(0, n_genes, size=n)] = True
+        trial = np.clip(np.where(crossover, mutant, self.population), 0, 1)
+        self.best_index = int(np.argmin(self.cost))
+        trial[self.best_index] = self.population[self.best_index]
+        return trial
+
+    def tell(self, genome, cost):
+        """
+        :param genome: array (n_individuals, n_genes) of the evaluated population (the trial vectors of ask)
+        :param cost: cost of each individual
+        """
+        genome, cost = np.array(genome, dtype=float), np.array(cost, dtype=float)
+        if self.population is None:
+            self.population, self.cost = genome, cost
+            return
+        better = cost <= self.cost
+        better[self.best_index] = True
+        self.population[better] = genome[better]
+        self.cost[better] = cost[better]
+        return
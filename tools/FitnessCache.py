@@ -0,0 +1,72 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 5:20 PM
+els.obrq@gmail.com
+
+"""
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+
+class FitnessCache(object):
+    """
+    Costs of the evaluated genomes by key (genome, scenario seed), with a maximum of max_size entries. When it is
+    full, the least recently used entry is removed. hits and misses count the calls of get, and are saved by
+    generation in historical_hits and historical_misses (see new_generation).
+    """
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.historical_hits = []
+        self.historical_misses = []
+
+    @staticmethod
+    def get_key(genome, scenario_seed):
+        # Hash of the genes as float64 (-0.0 is changed to 0.0) and of the seed of the scenario of the cases
+        genes = np.ascontiguousarray(genome, dtype=np.float64) + 0.0
+        return hashlib.sha1(genes.tobytes()).hexdigest(), scenario_seed
+
+    def get(self, key):
+        if key in self.data:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key]
+        self.misses += 1
+        return None
+
+    def get_population(self, keys):
+        """
+        Cached values of a list of keys. A key that is repeated in the list is counted as a hit.
+
+        :return: list of the cached values (None if it is not in the cache) and list of the index of the first key
+            of the list equal to each key
+        """
+        values, first_index, index = [], [], {}
+        for i, key in enumerate(keys):
+            first_index.append(index.setdefault(key, i))
+            if first_index[-1] != i:
+                self.hits += 1
+                values.append(values[first_index[-1]])
+            else:
+                values.append(self.get(key))
+        return values, first_index
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+        return
+
+    def new_generation(self):
+        # Save and reset the counters of the last generation
+        self.historical_hits.append(self.hits)
+        self.historical_misses.append(self.misses)
+        self.hits = 0
+        self.misses = 0
+        return
@@ -4,18 +4,139 @@ Author: Elias Obreque
 email: els.obrq@gmail.com
 """
 
+import multiprocessing
+import queue
+import time
 import numpy as np
-from scipy.stats import rankdata
+from scipy.stats import rankdata, chi2, t as t_student
 from matplotlib import pyplot as plt
 from tools.MonteCarlo import MonteCarlo
+from tools.GenomeSchema import GenomeSchema
+from tools.FitnessCache import FitnessCache
+from tools.ScenarioBank import ScenarioBank
+from tools.SurrogateModel import SurrogateModel
+from tools.ext_requirements import save_checkpoint_data, load_checkpoint_data
+from Dynamics.Dynamics import FULL, SUMMARY
 from copy import deepcopy
 
 plt.rcParams["font.family"] = "Times New Roman"
 plt.ion()
 
+# Reasons of the termination of optimize
+MAX_GENERATION = 'max_generation'
+STAGNATION = 'stagnation'
+DIVERSITY = 'diversity'
+TARGET_COST = 'target_cost'
+MAX_TIME = 'max_time'
+
+# Dynamics of the process that runs the tasks of the evaluation with workers (see init_worker and run_task)
+worker_dynamics = None
+
+
+def init_worker(dynamics):
+    global worker_dynamics
+    worker_dynamics = dynamics
+    return
+
+
+def set_engine_individual(dynamics, individual):
+    # Controller parameters, mass flow and burn time of the engines of an individual
+    dynamics.set_controller_parameters(individual[3:])
+    if type(individual[0]) == float:
+        for j in range(len(dynamics.thrusters)):
+            dynamics.modify_individual_engine(j, 'alpha', individual[0])
+            dynamics.modify_individual_engine(j, 't_burn', individual[1])
+    else:
+        for j in range(len(dynamics.thrusters)):
+            dynamics.modify_individual_engine(j, 'alpha', individual[0][j])
+            dynamics.modify_individual_engine(j, 't_burn', individual[1][j])
+    return
+
+
+def run_task(task):
+    """
+    Propagate a chunk of cases with worker_dynamics.
+
+    :param task: for a batch, ('batch', x0, xf, time_options, uncertainties, engine_parameters, record), with the
+        arrays of the rows of the chunk. Otherwise ('case', individual, cases, x0, xf, time_options, seed, record,
+        case_values), where the random generator is seeded with (seed, case) before the propagation of each case, so
+        the output of a case does not depend on the chunk or on the worker that runs it, and all the individuals use
+        the same random values in each case. case_values are the uncertainties of each case of a scenario bank (see
+        ScenarioBank.get_case_values), or None.
+    :return: list by case of the output of run_simulation
+    """
+    if task[0] == 'batch':
+        x0, xf, time_options, uncertainties, engine_parameters, record = task[1:]
+        output = worker_dynamics.run_simulation_batch(x0, xf, time_options, *uncertainties,
+                                                      engine_parameters=engine_parameters, record=record)
+        return output if record == SUMMARY else list(zip(*output))
+    individual, cases, x0, xf, time_options, seed, record, case_values = task[1:]
+    set_engine_individual(worker_dynamics, individual)
+    output = []
+    for i, k in enumerate(cases):
+        np.random.seed([seed, k])
+        for thrust in worker_dynamics.thrusters:
+            thrust.reset_variables()
+        if case_values is not None:
+            worker_dynamics.set_case_uncertainties(*case_values[i])
+        output.append(worker_dynamics.run_simulation(x0[i], xf, time_options, record=record))
+    return output
+
 
 class GeneticAlgorithm(object):
-    def __init__(self, max_generation=10, n_individuals=10, ranges_variable=None, mutation_probability=0.1):
+    def __init__(self, max_generation=10, n_individuals=10, ranges_variable=None, mutation_probability=0.1,
+                 batch_simulation=False, n_workers=None, fitness_cache_size=None, scenario_bank=False,
+                 scenario_seed=None, racing_block=None, racing_confidence=0.95, stagnation_generations=None,
+                 stagnation_tolerance=0.0, min_diversity=None, target_cost=None, max_time=None, checkpoint_file=None,
+                 checkpoint_interval=1, surrogate_candidates=None, surrogate_budget=None, optimizer=None,
+                 optimizer_options=None, fidelity_schedule=None, steady_state=False, scenario_sampler=None):
+        """
+        :param n_workers: number of processes to evaluate the population. If None, the population is evaluated in
+            sequence with the global random state. Otherwise the cases are propagated by chunks with a random seed by
+            task (see run_task), with the same result for any number of workers (1: without a process pool).
+        :param fitness_cache_size: maximum size of the cache of costs by genome (see FitnessCache). It is used with
+            summary_cost_function when the scenario of the cases is given by a seed (scenario bank, or n_workers
+            without batch simulation): the repeated genomes of the same scenario are not propagated again.
+        :param scenario_bank: if True, the initial states and the uncertainties of the engines of each generation are
+            drawn up front in a ScenarioBank, the same for all the individuals (common random numbers).
+        :param scenario_seed: seed of the scenario bank, to use the same bank in all the generations. If None, a new
+            bank is drawn in each generation.
+        :param scenario_sampler: SOBOL or LHS to sample jointly the initial states, Isp bias and dead time of the
+            scenario bank (see ScenarioBank), or None for i.i.d. samples
+        :param racing_block: number of cases of each block of the racing evaluation, or None to propagate all the
+            cases of each individual. With summary_cost_function, the cases are propagated by blocks and an individual
+            is aborted when the lower bound of its cost is higher than the upper bound of the costs of the individuals
+            that pass directly to the next generation (see race). It gets the lower bound as the cost of all the cases.
+        :param racing_confidence: confidence level of the bounds of the cost of the racing evaluation
+        :param stagnation_generations: stop optimize when the best cost has not improved in more than
+            stagnation_tolerance (relative) in this number of generations, or None
+        :param min_diversity: stop optimize when the diversity of the population (see get_diversity) is lower, or None
+        :param target_cost: stop optimize when the best cost is lower or equal, or None
+        :param max_time: stop optimize after this wall-clock time [s], or None. The reason of the termination is saved
+            in termination.
+        :param checkpoint_file: file (.npz) to save the state of optimize every checkpoint_interval generations, before
+            the evaluation of the generation (see save_checkpoint). optimize with resume=True continues from it.
+        :param surrogate_candidates: number of candidate children of each generation, ranked by a surrogate model of the
+            cost (see SurrogateModel) trained with the evaluated individuals. The children of lower predicted cost are
+            the new individuals. If None, the surrogate model is not used.
+        :param surrogate_budget: maximum number of new children propagated by generation, or None for all. The other
+            children get the predicted cost, limited as the aborted individuals of the racing evaluation.
+        :param optimizer: class of the optimizer of the continuous genes (see CMAES and DifferentialEvolution), or
+            None for the selection, crossover and mutation of the genetic algorithm. It is created with
+            (n_genes, n_individuals, **optimizer_options) and it must have the methods ask(), which returns the next
+            population as an array (n_individuals, n_genes) with the genes scaled to [0, 1], and tell(genome, cost),
+            with the scaled genes of the evaluated population and its cost (mean + std of the cases). The other genes
+            are taken from the first population, and the evaluation is the same of the genetic algorithm.
+        :param fidelity_schedule: list of [first generation, step width, number of cases] sorted by generation, to
+            evaluate the generations from the first generation with a coarse step width and less cases. None values
+            (and the generations before the first one of the list) use the step width of time_options and the n_case
+            of optimize (full fidelity). In the generations of lower fidelity, the individuals that pass directly to
+            the next generation are evaluated again with full fidelity, and the best of them is saved in the
+            historical costs and returned by optimize.
+        :param steady_state: if True, optimize evaluates the individuals asynchronously, without generations (see
+            run_steady_state). The cases are propagated with run_task (n_workers None is 1, without batch), and the
+            racing, surrogate model, optimizer, fidelity schedule, fitness cache and checkpoints are not used.
+        """
         self.Ah = 0.10
         self.Bh = 1.0
         self.Ch = 0.1
@@ -40,105 +161,167 @@ class GeneticAlgorithm(object):
         self.time_options = None
         self.propellant_properties = None
         self.thruster_properties = None
+        self.steady_state = steady_state
+        self.batch_simulation = batch_simulation and not steady_state
+        self.summary_cost_function = None
+        self.replay_data = None
+        self.n_workers = 1 if steady_state and n_workers is None else n_workers
+        self.pool = None
+        # Population as an array (n_individuals, n_genes), see GenomeSchema
+        self.schema = GenomeSchema(ranges_variable)
+        self.genome = None
+        self.fitness_cache = None
+        if fitness_cache_size is not None:
+            self.fitness_cache = FitnessCache(fitness_cache_size)
+        self.scenario_bank = scenario_bank
+        self.scenario_seed = scenario_seed
+        self.scenario_sampler = scenario_sampler
+        self.racing_block = racing_block
+        self.racing_confidence = racing_confidence
+        self.n_direct = 1
+        # Number of aborted individuals by generation of the racing evaluation
+        self.historical_aborted = []
+        self.stagnation_generations = stagnation_generations
+        self.stagnation_tolerance = stagnation_tolerance
+        self.min_diversity = min_diversity
+        self.target_cost = target_cost
+        self.max_time = max_time
+        # Best cost by generation, and reason, generation and time [s] of the termination of optimize
+        self.historical_best_cost = []
+        self.termination = None
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_interval = checkpoint_interval
+        # Function (ga, generation) called before the selection of each new generation, to exchange individuals with
+        # other populations (see IslandModel)
+        self.migration_function = None
+        self.surrogate_candidates = surrogate_candidates
+        self.surrogate_budget = surrogate_budget
+        self.surrogate = None
+        # Genes of the surrogate model and of the optimizer, the mutable genes with a range
+        self.continuous_genes = self.schema.mutable & (self.schema.upper > self.schema.lower)
+        if surrogate_candidates is not None:
+            self.surrogate = SurrogateModel(self.schema.lower[self.continuous_genes],
+                                            self.schema.upper[self.continuous_genes])
+        self.optimizer = None
+        if optimizer is not None:
+            self.optimizer = optimizer(int(np.sum(self.continuous_genes)), n_individuals, **(optimizer_options or {}))
+        # Individuals of the last evaluated population with a cost that is not from the simulations (racing or
+        # surrogate model)
+        self.current_estimated = []
+        self.fidelity_schedule = fidelity_schedule
         self.create_first_population()
 
     def create_first_population(self):
-        for k in range(self.n_individuals):
-            individual = []
-            for i in range(self.n_variables):
-                if self.range_variables[i][0] == 'float':
-                    temp = np.random.uniform(self.range_variables[i][1], self.range_variables[i][2])
-                    individual.append(temp)
-                elif self.range_variables[i][0] == 'int':
-                    if len(self.range_variables[i]) == 3:
-                        temp = np.random.randint(self.range_variables[i][1], self.range_variables[i][2])
-                    else:
-                        temp = self.range_variables[i][1]
-                        self.n_thrust = temp
-                    individual.append(temp)
-                elif self.range_variables[i][0] == 'str':
-                    type_pro = np.random.randint(1, len(self.range_variables[i]))
-                    temp = self.range_variables[i][type_pro]
-                    individual.append(temp)
-                elif self.range_variables[i][0] == 'float_iter':
-                    temp = []
-                    if self.range_variables[i][1] < self.range_variables[i][2]:
-                        left = self.range_variables[i][1]
-                        right = self.range_variables[i][2]
-                        width = self.range_variables[i][2] - self.range_variables[i][1]
-                    else:
-                        left = self.range_variables[i][2]
-                        right = self.range_variables[i][1]
-                        width = self.range_variables[i][1] - self.range_variables[i][2]
-
-                    for m in range(int(self.range_variables[i][3])):
-                        # temp.append(np.random.uniform(left, right))
-                        temp.append(np.random.triangular(left,
-                                                         left + width * 0.7,
-                                                         right))
-                        # temp.append(np.random.normal(left + width * 0.5, width * 0.5 / 3))
-
-                    individual.append(temp)
-            self.population.append(individual)
+        self.genome = self.schema.random_population(self.n_individuals)
+        for range_variable in self.range_variables:
+            if range_variable[0] == 'int' and len(range_variable) != 3:
+                self.n_thrust = range_variable[1]
+        self.population = self.decode_population()
         return
 
-    def optimize(self, cost_function=None, n_case=1, restriction_function=None, alt_noise=None):
+    def decode_population(self):
+        return [self.schema.decode(row) for row in self.genome]
+
+    def optimize(self, cost_function=None, n_case=1, restriction_function=None, alt_noise=None,
+                 summary_cost_function=None, resume=False):
+        """
+        :param summary_cost_function: cost function of the simulation summary (see Dynamics.run_simulation). If it is
+            given, the individuals are propagated with record='summary' and only the best individual is propagated
+            again with the full trajectory.
+        :param resume: if True, continue from the state saved in checkpoint_file, with the same result as the run
+            without interruption. The other arguments must be the same of the interrupted run.
+        """
         self.cost_function = cost_function
+        self.summary_cost_function = summary_cost_function
         self.ga_dynamics   = restriction_function[0]
         self.init_state    = restriction_function[1:3]
         self.time_options  = restriction_function[3]
         self.ga_dynamics.set_engines_properties(restriction_function[5], restriction_function[4], self.population[0][2])
+        if self.n_workers is not None:
+            # Each worker keeps its own copy of the dynamics and engines
+            self.ga_dynamics.controller_function = self.get_beta
+            init_worker(deepcopy(self.ga_dynamics))
+            if self.n_workers > 1:
+                self.pool = multiprocessing.Pool(self.n_workers, initializer=init_worker,
+                                                 initargs=(self.ga_dynamics,))
+        elif self.batch_simulation:
+            # The batch runs in one task with the dynamics of the algorithm
+            init_worker(self.ga_dynamics)
 
-        print('Running...')
-        generation = 1
-        states, time_data, Tf, index_control, end_index_control, land_index = self.ga_evaluate(self.population,
-                                                                                               n_case, alt_noise)
-        temp = np.mean(self.current_cost, 1) + np.std(self.current_cost, 1)
-        print('Generation: ', generation, ', Cost: ', min(temp))
-        self.historical_cost.append(self.current_cost[int(np.argmin(temp))])
         percent = 0.8
         n_indiv_by_selec = round(self.n_individuals * percent)
         rest_ind = n_indiv_by_selec % 2
         n_indiv_by_selec -= rest_ind
+        self.n_direct = self.n_individuals - n_indiv_by_selec
 
-        while generation < self.max_generation:
-            next_population = []
-            crossover_arith = True
-            if self.n_individuals - n_indiv_by_selec != 0:
-                descent = self.ga_selection(self.n_individuals - n_indiv_by_selec, direct_method=True)
-                next_population = next_population + descent
-            for i in range(int(n_indiv_by_selec * 0.5)):
-                index_parents = self.ga_selection(2)
-                if crossover_arith:
-                    descent1, descent2 = self.ga_crossover_arithmetic(index_parents[0], index_parents[1])
-                    crossover_arith = False
-                else:
-                    descent1, descent2 = self.ga_crossover_coding(index_parents[0], index_parents[1])
-                    crossover_arith = True
-
-                new_generation1 = self.ga_mutation(descent1, True)
-                new_generation2 = self.ga_mutation(descent2, True)
-                next_population.append(new_generation1)
-                next_population.append(new_generation2)
-            del self.population
-            self.population = deepcopy(next_population)
-            states, time_data, Tf, index_control, end_index_control, land_index = self.ga_evaluate(next_population,
-                                                                                                   n_case,
-                                                                                                   alt_noise)
+        print('Running...')
+        start_time = time.time()
+        self.termination = None
+        generation = 0
+        predicted_cost = {}
+        if resume:
+            generation, elapsed_time, predicted_cost = self.load_checkpoint()
+            start_time -= elapsed_time
+        elif self.optimizer is not None:
+            self.set_optimizer_genome(self.optimizer.ask())
+        reason = None
+        if self.steady_state:
+            reason, generation, best_index = self.run_steady_state(n_case, alt_noise, start_time)
+        while reason is None:
+            if self.checkpoint_file is not None and generation % self.checkpoint_interval == 0:
+                self.save_checkpoint(generation, time.time() - start_time, predicted_cost)
+            time_options, n_case_fidelity = self.get_fidelity(generation + 1, n_case)
+            full_time_options, self.time_options = self.time_options, time_options
+            states, time_data, Tf, index_control, end_index_control, land_index = self.ga_evaluate(self.population,
+                                                                                                   n_case_fidelity,
+                                                                                                   alt_noise,
+                                                                                                   predicted_cost)
+            self.time_options = full_time_options
+            if self.surrogate is not None:
+                evaluated = np.setdiff1d(np.arange(self.n_individuals), self.current_estimated)
+                self.surrogate.add(self.genome[evaluated][:, self.continuous_genes],
+                                   np.mean(self.current_cost, 1)[evaluated] + np.std(self.current_cost, 1)[evaluated])
             generation += 1
-            if generation > self.max_generation:
-                self.max_generation = generation
-            temp = np.mean(self.current_cost, 1) + np.std(self.current_cost, 1)
-            print('Generation: ', generation, ', Cost: ', min(temp))
-            self.historical_cost.append(self.current_cost[int(np.argmin(temp))])
-
-        best_index = int(np.argmin(temp))
-        best_states, best_Tf = states[best_index], Tf[best_index]
+            best_cost = self.current_cost
+            if time_options[2] != self.time_options[2] or n_case_fidelity != n_case:
+                (states, time_data, Tf, index_control, end_index_control, land_index), best_cost = \
+                    self.rescore_elites(n_case, alt_noise)
+            temp = np.mean(best_cost, 1) + np.std(best_cost, 1)
+            best_index = int(np.argmin(temp))
+            print('Generation: ', generation, ', Cost: ', temp[best_index])
+            self.historical_cost.append(best_cost[best_index])
+            self.historical_best_cost.append(temp[best_index])
+            reason = MAX_GENERATION if generation >= self.max_generation else self.check_termination(start_time)
+            if reason is None and self.migration_function is not None:
+                self.migration_function(self, generation)
+            if reason is None and self.optimizer is not None:
+                # The cost is computed again, the migration can change the population
+                self.optimizer.tell(self.get_optimizer_genome(),
+                                    np.mean(self.current_cost, 1) + np.std(self.current_cost, 1))
+                self.set_optimizer_genome(self.optimizer.ask())
+            elif reason is None:
+                # The best individuals pass directly, the rest are children of selected parents
+                descent = self.ga_selection(self.n_direct, direct_method=True)
+                children, predicted_cost = self.create_surrogate_children(n_indiv_by_selec)
+                self.genome = np.concatenate((self.genome[descent], children))
+                self.population = self.decode_population()
+
+        self.termination = {'reason': reason, 'generation': generation, 'time': time.time() - start_time}
+        print('Termination: ', self.termination['reason'], ', Generation: ', generation)
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
         best_individuals = self.population[best_index]
-        best_index_control = index_control[best_index]
-        best_end_index_control = end_index_control[best_index]
-        best_time_data = time_data[best_index]
-        best_landing_index = land_index[best_index]
+        if self.summary_cost_function is not None or self.steady_state:
+            best_states, best_time_data, best_Tf, best_index_control, best_end_index_control, best_landing_index = \
+                self.replay_individual(best_index, n_case)
+        else:
+            best_states, best_Tf = states[best_index], Tf[best_index]
+            best_index_control = index_control[best_index]
+            best_end_index_control = end_index_control[best_index]
+            best_time_data = time_data[best_index]
+            best_landing_index = land_index[best_index]
         # self.plot_cost(n_case)
         return best_states, best_time_data, best_Tf, best_individuals, best_index_control,\
                best_end_index_control, best_landing_index
@@ -148,10 +331,268 @@ class GeneticAlgorithm(object):
         plt.xlabel('Generation')
         plt.ylabel('Optimization function')
         for k in range(n_case):
-            plt.plot(np.arange(1, self.max_generation + 1), np.array(self.historical_cost)[:, k], lw=0.8)
+            plt.plot(np.arange(1, len(self.historical_cost) + 1), np.array(self.historical_cost)[:, k], lw=0.8)
         plt.grid()
 
-    def ga_evaluate(self, next_population, n_case, alt_noise_):
+    def get_fidelity(self, generation, n_case):
+        """
+        :return: time options and number of cases of the generation (from 1) with the fidelity schedule
+        """
+        time_options, n_case_fidelity = self.time_options, n_case
+        for first_generation, step_width, n_case_stage in self.fidelity_schedule or []:
+            if generation >= first_generation:
+                time_options = list(self.time_options[:2]) + [self.time_options[2] if step_width is None
+                                                               else step_width]
+                n_case_fidelity = n_case if n_case_stage is None else min(n_case_stage, n_case)
+        return time_options, n_case_fidelity
+
+    def rescore_elites(self, n_case, alt_noise):
+        """
+        Evaluate again with full fidelity the n_direct individuals of lower cost of the last evaluation, without
+        racing. The cost of the last evaluation is kept for the selection.
+
+        :return: output of ga_evaluate, and cost of the cases by individual, with the cost of the other individuals
+            limited as the aborted individuals of the racing evaluation
+        """
+        elites = self.ga_selection(self.n_direct, direct_method=True)
+        current_cost, current_estimated = self.current_cost, self.current_estimated
+        racing_block, n_aborted = self.racing_block, len(self.historical_aborted)
+        self.racing_block = None
+        output = self.ga_evaluate(self.population, n_case, alt_noise,
+                                  {indv: 0.0 for indv in range(self.n_individuals) if indv not in elites})
+        elite_cost = self.current_cost
+        self.current_cost, self.current_estimated = current_cost, current_estimated
+        self.racing_block = racing_block
+        del self.historical_aborted[n_aborted:]
+        return output, elite_cost
+
+    def run_steady_state(self, n_case, alt_noise, start_time):
+        """
+        Asynchronous evaluation without generation barriers. Each individual is propagated in one task of all the cases
+        (see run_task), with the same scenario of cases for all the individuals. When the first population is
+        evaluated, as each task returns, the new individual replaces the individual of higher cost of the population if
+        its cost is lower, and a new child of selected parents is submitted, so the n_workers are always busy. Each
+        n_individuals evaluations are counted as a generation for the histories, the migration and the termination.
+
+        :return: reason of the termination, number of generations and index of the best individual
+        """
+        self.ga_dynamics.controller_function = self.get_beta
+        self.ga_dynamics.set_step_width(self.time_options[2])
+        bank, case_x0 = self.get_case_initial_states(n_case, alt_noise)
+        record = FULL if self.summary_cost_function is None else SUMMARY
+        self.replay_data = {'x0': case_x0, 'bank': bank, 'seed': np.random.randint(2 ** 31)}
+        case_values = None if bank is None else [bank.get_case_values(k) for k in range(n_case)]
+        results = queue.Queue()
+        children = []
+        n_pending = [0]
+
+        def submit(genome):
+            task = ('case', self.schema.decode(genome), list(range(n_case)), case_x0, self.init_state[1],
+                    self.time_options, self.replay_data['seed'], record, case_values)
+            n_pending[0] += 1
+            if self.pool is not None:
+                # The callbacks run in a thread of the pool
+                self.pool.apply_async(run_task, (task,), callback=lambda output: results.put((genome, output)),
+                                      error_callback=lambda error: results.put((genome, error)))
+            else:
+                rng_state = np.random.get_state()
+                results.put((genome, run_task(task)))
+                np.random.set_state(rng_state)
+            return
+
+        def submit_child():
+            # Children of two pairs of parents, with arithmetic and coding crossover (see create_children)
+            if len(children) == 0:
+                children.extend(self.create_children(4))
+            submit(children.pop(0))
+            return
+
+        first_genome = self.genome
+        self.genome = np.zeros_like(first_genome)
+        self.current_cost = [None] * self.n_individuals
+        for genome in first_genome:
+            submit(genome)
+        generation, n_evaluated, reason = 0, 0, None
+        best_index = 0
+        while n_pending[0] > 0:
+            genome, output = results.get()
+            n_pending[0] -= 1
+            if isinstance(output, Exception):
+                raise output
+            cost = [self.get_case_cost(case_output, record) for case_output in output]
+            if n_evaluated < self.n_individuals:
+                # The first population is saved in the order of the evaluation
+                indv = n_evaluated
+            else:
+                temp = np.mean(self.current_cost, 1) + np.std(self.current_cost, 1)
+                indv = int(np.argmax(temp))
+                if np.mean(cost) + np.std(cost) >= temp[indv]:
+                    indv = None
+            if indv is not None:
+                self.genome[indv] = genome
+                self.current_cost[indv] = cost
+            n_evaluated += 1
+            if n_evaluated % self.n_individuals == 0:
+                generation += 1
+                temp = np.mean(self.current_cost, 1) + np.std(self.current_cost, 1)
+                best_index = int(np.argmin(temp))
+                print('Generation: ', generation, ', Cost: ', temp[best_index])
+                self.historical_cost.append(self.current_cost[best_index])
+                self.historical_best_cost.append(temp[best_index])
+                reason = MAX_GENERATION if generation >= self.max_generation else self.check_termination(start_time)
+                if reason is None and self.migration_function is not None:
+                    self.population = self.decode_population()
+                    self.migration_function(self, generation)
+                    best_index = int(np.argmin(np.mean(self.current_cost, 1) + np.std(self.current_cost, 1)))
+            if reason is not None:
+                break
+            if n_evaluated == self.n_individuals:
+                for _ in range(1 if self.pool is None else self.n_workers):
+                    submit_child()
+            elif n_evaluated > self.n_individuals:
+                submit_child()
+        if self.pool is not None:
+            # The individuals in evaluation are discarded
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.population = self.decode_population()
+        return reason, generation, best_index
+
+    def get_optimizer_genome(self):
+        # Continuous genes of the population scaled to [0, 1]
+        lower = self.schema.lower[self.continuous_genes]
+        upper = self.schema.upper[self.continuous_genes]
+        return (self.genome[:, self.continuous_genes] - lower) / (upper - lower)
+
+    def set_optimizer_genome(self, genome):
+        # Population with the continuous genes of the optimizer, scaled to [0, 1]
+        lower = self.schema.lower[self.continuous_genes]
+        upper = self.schema.upper[self.continuous_genes]
+        self.genome = self.genome.copy()
+        self.genome[:, self.continuous_genes] = lower + np.clip(genome, 0, 1) * (upper - lower)
+        self.population = self.decode_population()
+        return
+
+    def create_children(self, n_children):
+        # Children of pairs of selected parents, with arithmetic and coding crossover in alternate pairs, and mutation
+        index_parents = np.reshape(self.ga_selection(n_children), (-1, 2))
+        children = np.zeros((len(index_parents), 2, self.schema.n_genes))
+        children[0::2, 0], children[0::2, 1] = self.ga_crossover_arithmetic(index_parents[0::2, 0],
+                                                                            index_parents[0::2, 1])
+        children[1::2, 0], children[1::2, 1] = self.ga_crossover_coding(index_parents[1::2, 0],
+                                                                        index_parents[1::2, 1])
+        return self.ga_mutation(np.reshape(children, (-1, self.schema.n_genes)))
+
+    def create_surrogate_children(self, n_children):
+        """
+        Children of the next generation. With the surrogate model, the n_children of lower predicted cost of
+        surrogate_candidates children, and only the first surrogate_budget are propagated.
+
+        :return: array of the genes of the children, and dict of the predicted cost of the children that are not
+            propagated, by index of the next population
+        """
+        if self.surrogate is None or not self.surrogate.is_ready():
+            return self.create_children(n_children), {}
+        candidates = self.create_children(self.surrogate_candidates + self.surrogate_candidates % 2)
+        try:
+            cost = self.surrogate.predict(candidates[:, self.continuous_genes])
+        except np.linalg.LinAlgError:
+            print('Surrogate model without solution, the candidates are not ranked')
+            return candidates[:n_children], {}
+        order = np.argsort(cost, kind='stable')[:n_children]
+        budget = n_children if self.surrogate_budget is None else self.surrogate_budget
+        n_direct = self.n_individuals - n_children
+        return candidates[order], {n_direct + i: cost[order[i]] for i in range(budget, len(order))}
+
+    def save_checkpoint(self, generation, elapsed_time, predicted_cost=None):
+        """
+        Save in checkpoint_file the population to evaluate, the costs and histories, the number of evaluated
+        generations, the global random state, the dead time of the engines, the fitness cache, the surrogate model
+        with the predicted cost of the population, and the optimizer.
+        """
+        # The dead time of the next case is drawn by the reset of the engines after the previous case
+        cache = {'dead_time': np.array([thruster.selected_propellant.dead_time
+                                        for thruster in self.ga_dynamics.thrusters], dtype=float)}
+        if self.fitness_cache is not None:
+            cache = {'cache_keys': np.array(list(self.fitness_cache.data.keys()) + [None], dtype=object)[:-1],
+                     'cache_values': np.array(list(self.fitness_cache.data.values())),
+                     'cache_hits': np.array(self.fitness_cache.historical_hits, dtype=int),
+                     'cache_misses': np.array(self.fitness_cache.historical_misses, dtype=int)}
+        if self.surrogate is not None:
+            cache['surrogate_genome'] = self.surrogate.genome
+            cache['surrogate_log_cost'] = self.surrogate.log_cost
+            cache['predicted_cost'] = np.array(sorted((predicted_cost or {}).items())).reshape(-1, 2)
+        if self.optimizer is not None:
+            cache['optimizer'] = np.array([self.optimizer, None], dtype=object)[:1]
+        save_checkpoint_data(self.checkpoint_file, genome=self.genome, current_cost=np.array(self.current_cost),
+                             historical_cost=np.array(self.historical_cost),
+                             historical_best_cost=np.array(self.historical_best_cost),
+                             historical_aborted=np.array(self.historical_aborted, dtype=int), generation=generation,
+                             elapsed_time=elapsed_time, **cache)
+        return
+
+    def load_checkpoint(self):
+        """
+        Load the state saved by save_checkpoint.
+
+        :return: number of evaluated generations, elapsed time [s] and predicted cost of the saved state
+        """
+        data = load_checkpoint_data(self.checkpoint_file)
+        self.genome = data['genome']
+        self.population = self.decode_population()
+        self.current_cost = data['current_cost'].tolist()
+        self.historical_cost = data['historical_cost'].tolist()
+        self.historical_best_cost = data['historical_best_cost'].tolist()
+        self.historical_aborted = data['historical_aborted'].tolist()
+        if 'dead_time' in data:
+            for thruster, dead_time in zip(self.ga_dynamics.thrusters, data['dead_time']):
+                thruster.selected_propellant.dead_time = float(dead_time)
+        if self.fitness_cache is not None and 'cache_keys' in data:
+            self.fitness_cache.data.clear()
+            for key, value in zip(data['cache_keys'], data['cache_values']):
+                self.fitness_cache.data[key] = value.tolist()
+            self.fitness_cache.historical_hits = data['cache_hits'].tolist()
+            self.fitness_cache.historical_misses = data['cache_misses'].tolist()
+        predicted_cost = {}
+        if self.surrogate is not None and 'surrogate_genome' in data:
+            self.surrogate.genome = data['surrogate_genome']
+            self.surrogate.log_cost = data['surrogate_log_cost']
+            self.surrogate.model = None
+            predicted_cost = {int(indv): cost for indv, cost in data['predicted_cost']}
+        if self.optimizer is not None and 'optimizer' in data:
+            self.optimizer = data['optimizer'][0]
+        return int(data['generation']), float(data['elapsed_time']), predicted_cost
+
+    def check_termination(self, start_time):
+        """
+        :return: reason of the termination of optimize after the last evaluated generation, or None to continue
+        """
+        best_cost = self.historical_best_cost
+        if self.target_cost is not None and best_cost[-1] <= self.target_cost:
+            return TARGET_COST
+        if self.stagnation_generations is not None and len(best_cost) > self.stagnation_generations:
+            previous_cost = best_cost[-1 - self.stagnation_generations]
+            if previous_cost - best_cost[-1] <= self.stagnation_tolerance * abs(previous_cost):
+                return STAGNATION
+        if self.min_diversity is not None and self.get_diversity() < self.min_diversity:
+            return DIVERSITY
+        if self.max_time is not None and time.time() - start_time >= self.max_time:
+            return MAX_TIME
+        return None
+
+    def get_diversity(self):
+        # Mean of the standard deviation of the mutable genes of the population, normalized by their ranges
+        genes = self.schema.mutable & (self.schema.upper > self.schema.lower)
+        if not np.any(genes):
+            return 0.0
+        return float(np.mean(np.std(self.genome[:, genes], axis=0) / (self.schema.upper - self.schema.lower)[genes]))
+
+    def ga_evaluate(self, next_population, n_case, alt_noise_, predicted_cost=None):
+        """
+        :param predicted_cost: dict of the predicted cost of the individuals that are not propagated, by index (see
+            create_surrogate_children)
+        """
         self.current_cost = []
         X_states = []
         THR      = []
@@ -160,20 +601,35 @@ class GeneticAlgorithm(object):
         TIME     = []
         LAND_INDEX = []
         self.ga_dynamics.controller_function = self.get_beta
+        self.ga_dynamics.set_step_width(self.time_options[2])
 
-        # # Generation of case (Monte Carlo)
-        rN = []
-        vN = []
-        mN = []
-        alt_noise = False
-        if alt_noise_ is not None:
-            alt_noise = alt_noise_[0]
-            sdr = alt_noise_[1]
-            sdv = alt_noise_[2]
-            sdm = 0
-            rN = MonteCarlo(self.init_state[0][0], sdr, n_case).random_value()
-            vN = MonteCarlo(self.init_state[0][1], sdv, n_case).random_value()
-            mN = MonteCarlo(self.init_state[0][2], sdm, n_case).random_value()
+        bank, case_x0 = self.get_case_initial_states(n_case, alt_noise_)
+        record = FULL if self.summary_cost_function is None else SUMMARY
+        # Random values of each individual, to propagate again the best one (see replay_individual)
+        self.replay_data = {'x0': case_x0, 'thrusters': {}, 'rng_state': {}, 'bank': bank}
+
+        cached_cost = [None] * self.n_individuals
+        use_cache = False
+        if self.n_workers is not None and not self.batch_simulation:
+            self.replay_data['seed'] = np.random.randint(2 ** 31)
+        if self.fitness_cache is not None and record == SUMMARY:
+            # The scenario of the cases must be given by a seed
+            if bank is not None:
+                use_cache = True
+                scenario_seed = bank.seed, n_case, self.time_options[2]
+            elif self.n_workers is not None and not self.batch_simulation:
+                use_cache = True
+                scenario_seed = self.get_scenario_seed(case_x0, self.replay_data['seed']) + (self.time_options[2],)
+        if use_cache:
+            keys = [FitnessCache.get_key(row, scenario_seed) for row in self.genome]
+            cached_cost, first_index = self.fitness_cache.get_population(keys)
+        # Cases of each block of the evaluation, the racing evaluation is used with the summary cost function
+        blocks = [np.arange(n_case)]
+        if self.racing_block is not None and record == SUMMARY:
+            blocks = [np.arange(n_case)[k:k + self.racing_block] for k in range(0, n_case, self.racing_block)]
+        racing = len(blocks) > 1
+        # Cost of the individuals that are aborted (racing) or not propagated (predicted cost)
+        aborted_cost = dict(predicted_cost or {})
 
         for indv in range(self.n_individuals):
             X_states.append([])
@@ -183,40 +639,286 @@ class GeneticAlgorithm(object):
             TIME.append([])
             LAND_INDEX.append([])
             self.current_cost.append([])
-            self.ga_dynamics.set_controller_parameters(next_population[indv][3:])
+            if use_cache and cached_cost[indv] is not None:
+                self.current_cost[indv] = list(cached_cost[indv])
+        simulate = [(cost is None and first_index[indv] == indv if use_cache else True) and indv not in aborted_cost
+                    for indv, cost in enumerate(cached_cost)]
+
+        if self.n_workers is not None or self.batch_simulation:
+            # All the individuals propagate each block before the racing
+            for cases in blocks:
+                task_output = self.run_worker_tasks(next_population, case_x0, record, simulate, cases)
+                for indv in np.flatnonzero(simulate):
+                    for output in task_output[indv]:
+                        self.add_case_output(indv, output, record, X_states, TIME, THR, IC, EC, LAND_INDEX)
+                if racing:
+                    simulate = self.race(simulate, n_case, aborted_cost)
+        else:
+            for indv in np.flatnonzero(simulate):
+                if record == SUMMARY and bank is None:
+                    self.replay_data['thrusters'][indv] = deepcopy(self.ga_dynamics.thrusters)
+                    self.replay_data['rng_state'][indv] = np.random.get_state()
+                self.set_individual(next_population[indv])
+                for cases in blocks:
+                    for k in cases:
+                        if bank is not None:
+                            self.ga_dynamics.set_case_uncertainties(*bank.get_case_values(k))
+                        output = self.ga_dynamics.run_simulation(case_x0[k], self.init_state[1], self.time_options,
+                                                                 record=record)
+                        # Reset thruster
+                        for thrust in self.ga_dynamics.thrusters:
+                            thrust.reset_variables()
+                        self.add_case_output(indv, output, record, X_states, TIME, THR, IC, EC, LAND_INDEX)
+                    if racing and not self.race(np.arange(self.n_individuals) == indv, n_case, aborted_cost)[indv]:
+                        break
+            if bank is not None:
+                self.ga_dynamics.set_case_uncertainties(None, None, None)
 
-            if type(next_population[indv][0]) == float:
-                for j in range(len(self.ga_dynamics.thrusters)):
-                    self.ga_dynamics.modify_individual_engine(j, 'alpha', next_population[indv][0])
-                    self.ga_dynamics.modify_individual_engine(j, 't_burn', next_population[indv][1])
+        n_predicted = len(predicted_cost or {})
+        if len(aborted_cost) > 0:
+            # The aborted individuals do not pass directly to the next generation with the cost of the lower bound
+            cutoff = self.race([False] * self.n_individuals, n_case, aborted_cost, return_cutoff=True)
+            for indv in aborted_cost:
+                aborted_cost[indv] = max(aborted_cost[indv], np.nextafter(cutoff, np.inf))
+        for indv in range(self.n_individuals):
+            if indv in aborted_cost:
+                self.current_cost[indv] = [aborted_cost[indv]] * n_case
+            elif use_cache and cached_cost[indv] is None and first_index[indv] != indv:
+                # Cost of the same genome in this population
+                self.current_cost[indv] = list(self.current_cost[first_index[indv]])
+            elif use_cache and simulate[indv]:
+                self.fitness_cache.put(keys[indv], list(self.current_cost[indv]))
+        self.current_estimated = sorted(aborted_cost)
+        if racing:
+            self.historical_aborted.append(len(aborted_cost) - n_predicted)
+        if use_cache:
+            self.fitness_cache.new_generation()
+        return X_states, TIME, THR, IC, EC, LAND_INDEX
+
+    def get_case_initial_states(self, n_case, alt_noise_):
+        """
+        :return: scenario bank of the cases (or None) and initial state of each case
+        """
+        # # Generation of case (Monte Carlo)
+        rN = []
+        vN = []
+        mN = []
+        alt_noise = False
+        bank = None
+        if self.scenario_bank:
+            bank = self.get_scenario_bank(n_case, alt_noise_)
+            case_x0 = bank.x0.tolist()
+        else:
+            if alt_noise_ is not None:
+                alt_noise = alt_noise_[0]
+                sdr = alt_noise_[1]
+                sdv = alt_noise_[2]
+                sdm = 0
+                rN = MonteCarlo(self.init_state[0][0], sdr, n_case).random_value()
+                vN = MonteCarlo(self.init_state[0][1], sdv, n_case).random_value()
+                mN = MonteCarlo(self.init_state[0][2], sdm, n_case).random_value()
+            if alt_noise:
+                case_x0 = [[rN[k], vN[k], mN[k]] for k in range(n_case)]
             else:
-                for j in range(len(self.ga_dynamics.thrusters)):
-                    self.ga_dynamics.modify_individual_engine(j, 'alpha', next_population[indv][0][j])
-                    self.ga_dynamics.modify_individual_engine(j, 't_burn', next_population[indv][1][j])
+                case_x0 = [self.init_state[0]] * n_case
+        return bank, case_x0
 
-            for k in range(n_case):
-                if alt_noise:
-                    x0 = [rN[k], vN[k], mN[k]]
+    def add_case_output(self, indv, output, record, X_states, TIME, THR, IC, EC, LAND_INDEX):
+        # Cost of the output of a case of an individual, and its full simulation output
+        self.current_cost[indv].append(self.get_case_cost(output, record))
+        if record == SUMMARY:
+            return
+        x_states, time_series, thr, index_control, end_index_control, land_i = output
+        X_states[indv].append(x_states)
+        LAND_INDEX[indv].append(land_i)
+        THR[indv].append(thr)
+        TIME[indv].append(time_series)
+        IC[indv].append(index_control)
+        EC[indv].append(end_index_control)
+        return
+
+    def get_case_cost(self, output, record):
+        if record == SUMMARY:
+            return self.summary_cost_function(output, self.Ah, self.Bh)
+        x_states, time_series, thr, index_control, end_index_control, land_i = output
+        return self.cost_function(x_states, thr, time_series, land_i, self.Ah, self.Bh)
+
+    def race(self, simulate, n_case, aborted_cost, return_cutoff=False):
+        """
+        Abort the simulated individuals whose lower bound of the cost is higher than the n_direct-th lower upper bound
+        of the costs of the individuals that are not aborted, i.e., they would not pass directly to the next generation.
+
+        :param simulate: list by individual, True for the individuals in evaluation
+        :param aborted_cost: dict of the cost of the aborted individuals, updated with the new ones
+        :return: simulate without the aborted individuals, or the cutoff of the lower bounds with return_cutoff
+        """
+        bounds = [self.get_cost_bounds(cost, n_case) for cost in self.current_cost]
+        upper = np.sort([bound[1] for indv, bound in enumerate(bounds) if indv not in aborted_cost])
+        cutoff = upper[max(self.n_direct, 1) - 1]
+        if return_cutoff:
+            return cutoff
+        simulate = list(simulate)
+        for indv in np.flatnonzero(simulate):
+            if bounds[indv][0] > cutoff:
+                simulate[indv] = False
+                aborted_cost[indv] = bounds[indv][0]
+        return simulate
+
+    def get_cost_bounds(self, cost, n_case):
+        """
+        Confidence bounds of the cost mean + std of n_case cases from the costs of the first cases, with the normal
+        interval of Student's t of the mean and the chi-square interval of the standard deviation.
+        """
+        n = len(cost)
+        if n == n_case:
+            fitness = np.mean(cost) + np.std(cost)
+            return fitness, fitness
+        if n < 2:
+            return -np.inf, np.inf
+        mean = np.mean(cost)
+        std = np.std(cost, ddof=1)
+        # The cost uses the standard deviation of the population of n_case cases
+        std_factor = np.sqrt((n - 1) / chi2.ppf([self.racing_confidence, 1 - self.racing_confidence], n - 1)) \
+            * np.sqrt((n_case - 1) / n_case)
+        mean_error = t_student.ppf(self.racing_confidence, n - 1) * std / np.sqrt(n)
+        return mean - mean_error + std * std_factor[0], mean + mean_error + std * std_factor[1]
+
+    def get_scenario_bank(self, n_case, alt_noise_):
+        """
+        Scenario bank of the generation, with the seed scenario_seed (the same bank in all generations) or with a
+        seed of the global random state. The Isp noise covers the maximum burn time of the range of variables.
+        """
+        seed = self.scenario_seed
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+        thrusters = self.ga_dynamics.thrusters
+        max_burn_time = self.schema.variables[1]['upper'] + max(thruster.dead_time + thruster.lag_coef
+                                                                for thruster in thrusters)
+        n_step = int(np.ceil(max_burn_time / self.time_options[2])) + 2
+        state_std = None
+        if alt_noise_ is not None and alt_noise_[0]:
+            state_std = [alt_noise_[1], alt_noise_[2], 0]
+        return ScenarioBank(self.init_state[0], n_case, thrusters, n_step, state_std, seed, self.scenario_sampler)
+
+    @staticmethod
+    def get_scenario_seed(case_x0, seed):
+        # The scenario of the cases is given by the initial states and the seed of the random values of the engines
+        return seed, FitnessCache.get_key(case_x0, None)[0]
+
+    def run_worker_tasks(self, next_population, case_x0, record, simulate, cases=None):
+        """
+        Propagate the cases of the individuals by chunks with run_task, in the process pool if there is more than
+        one worker, or in one batch without workers. The random values are drawn here (batch), seeded from
+        replay_data['seed'] or taken from the scenario bank, so the output is the same for any number of workers.
+
+        :param simulate: list by individual, False to skip the individual
+        :param cases: indexes of the cases to propagate, or None for all the cases. In batch, the random values of all
+            the cases are drawn in the first call of the generation.
+        :return: list by individual of the output of each case, None for the skipped individuals
+        """
+        n_case = len(case_x0)
+        if cases is None:
+            cases = np.arange(n_case)
+        xf = self.init_state[1]
+        bank = self.replay_data['bank']
+        individuals = np.flatnonzero(simulate)
+        if len(individuals) == 0:
+            return [None] * self.n_individuals
+        n_chunk = 1 if self.n_workers is None else self.n_workers
+        tasks = []
+        if self.batch_simulation:
+            if 'engine_list' not in self.replay_data:
+                engine_list = []
+                for indv in range(self.n_individuals):
+                    self.set_individual(next_population[indv])
+                    engine_list.append(self.ga_dynamics.get_batch_engine_parameters())
+                # Rows of the case k of the individual indv: indv * n_case + k
+                engine_parameters = self.ga_dynamics.stack_batch_engine_parameters(engine_list, n_case)
+                if bank is not None:
+                    uncertainties = bank.get_batch_values(self.n_individuals)
                 else:
-                    x0 = self.init_state[0]
-
-                x_states, time_series, thr, index_control, end_index_control, land_i = self.ga_dynamics.run_simulation(
-                    x0,
-                    self.init_state[1],
-                    self.time_options)
-
-                j_cost = self.cost_function(x_states, thr, time_series, land_i, self.Ah, self.Bh)
-                self.current_cost[indv].append(j_cost)
-                X_states[indv].append(x_states)
-                LAND_INDEX[indv].append(land_i)
-                THR[indv].append(thr)
-                TIME[indv].append(time_series)
-                IC[indv].append(index_control)
-                EC[indv].append(end_index_control)
-                # Reset thruster
+                    uncertainties = self.ga_dynamics.get_batch_uncertainties(self.n_individuals * n_case, None, None,
+                                                                             None, engine_parameters)
+                self.replay_data['engine_list'] = engine_list
+                self.replay_data['engine_parameters'] = engine_parameters
+                self.replay_data['uncertainties'] = uncertainties
+            engine_parameters = self.replay_data['engine_parameters']
+            uncertainties = self.replay_data['uncertainties']
+            x0 = np.array(case_x0, dtype=float)
+            for chunk in np.array_split(individuals, min(n_chunk, len(individuals))):
+                rows = (chunk[:, None] * n_case + cases).ravel()
+                tasks.append(('batch', x0[rows % n_case], xf, self.time_options,
+                              [None if values is None else values[rows] for values in uncertainties],
+                              {key: values[rows] for key, values in engine_parameters.items()}, record))
+        else:
+            # Chunks of cases of each individual, to have some tasks by worker
+            n_chunk = min(len(cases), int(np.ceil(4 * n_chunk / self.n_individuals)))
+            for indv in individuals:
+                for chunk in np.array_split(cases, n_chunk):
+                    case_values = None if bank is None else [bank.get_case_values(k) for k in chunk]
+                    tasks.append(('case', next_population[indv], chunk.tolist(), [case_x0[k] for k in chunk], xf,
+                                  self.time_options, self.replay_data['seed'], record, case_values))
+        if self.pool is not None:
+            output = self.pool.map(run_task, tasks)
+        else:
+            # The tasks seed the global random state, it is restored for the next steps of the algorithm
+            rng_state = np.random.get_state()
+            output = [run_task(task) for task in tasks]
+            np.random.set_state(rng_state)
+        output = [case_output for task_output in output for case_output in task_output]
+        task_output = [None] * self.n_individuals
+        for i, indv in enumerate(individuals):
+            task_output[indv] = output[i * len(cases):(i + 1) * len(cases)]
+        return task_output
+
+    def replay_individual(self, indv, n_case):
+        """
+        Propagate again the cases of an individual of the last evaluated population, with the random values used in
+        ga_evaluate, and return the full simulation output of each case.
+        """
+        rng_state = np.random.get_state()
+        output = [[] for _ in range(6)]
+        bank = self.replay_data['bank']
+        if self.batch_simulation:
+            if bank is not None:
+                isp_bias, isp_noise, dead_time = bank.get_batch_values()
+            else:
+                rows = slice(indv * n_case, (indv + 1) * n_case)
+                isp_bias, isp_noise, dead_time = [None if values is None else values[rows]
+                                                  for values in self.replay_data['uncertainties']]
+            engine_parameters = self.ga_dynamics.stack_batch_engine_parameters(
+                [self.replay_data['engine_list'][indv]], n_case)
+            output = self.ga_dynamics.run_simulation_batch(np.array(self.replay_data['x0'], dtype=float),
+                                                           self.init_state[1], self.time_options, isp_bias, isp_noise,
+                                                           dead_time, engine_parameters=engine_parameters)
+        elif self.n_workers is not None:
+            case_values = None if bank is None else [bank.get_case_values(k) for k in range(n_case)]
+            output = list(zip(*run_task(('case', self.population[indv], list(range(n_case)), self.replay_data['x0'],
+                                         self.init_state[1], self.time_options, self.replay_data['seed'], FULL,
+                                         case_values))))
+        else:
+            thrusters = self.ga_dynamics.thrusters
+            if bank is None:
+                self.ga_dynamics.thrusters = deepcopy(self.replay_data['thrusters'][indv])
+                np.random.set_state(self.replay_data['rng_state'][indv])
+            self.set_individual(self.population[indv])
+            for k in range(n_case):
+                if bank is not None:
+                    self.ga_dynamics.set_case_uncertainties(*bank.get_case_values(k))
+                case_output = self.ga_dynamics.run_simulation(self.replay_data['x0'][k], self.init_state[1],
+                                                              self.time_options)
+                for i in range(6):
+                    output[i].append(case_output[i])
                 for thrust in self.ga_dynamics.thrusters:
                     thrust.reset_variables()
-        return X_states, TIME, THR, IC, EC, LAND_INDEX
+            self.ga_dynamics.thrusters = thrusters
+            if bank is not None:
+                self.ga_dynamics.set_case_uncertainties(None, None, None)
+        np.random.set_state(rng_state)
+        return [list(values) for values in output]
+
+    def set_individual(self, individual):
+        set_engine_individual(self.ga_dynamics, individual)
 
     @staticmethod
     def get_beta(control_par, current_state, type_control='affine'):
@@ -238,126 +940,71 @@ class GeneticAlgorithm(object):
             return 0
 
     def ga_selection(self, n, direct_method=False):
-        if direct_method is False:
-            temp = np.mean(self.current_cost, 1) + np.std(self.current_cost, 1)
-            if self.selection_method == 'roulette':
-                probability_selection = np.array(temp) / np.sum(temp)
-                ind_selected = np.random.choice(a=np.arange(self.n_individuals),
-                                                size=n,
-                                                p=list(probability_selection),
-                                                replace=True)
-            elif self.selection_method == "rank":
-                ranks = rankdata(1 * np.array(temp))
-                selection_probability = 1 / ranks
-                selection_probability = selection_probability / np.sum(selection_probability)
-                ind_selected = np.random.choice(a=np.arange(self.n_individuals),
-                                                size=n,
-                                                p=list(selection_probability),
-                                                replace=True)
-            else:
-                print('Select method')
-                ind_selected = []
+        """
+        :return: indexes of the n selected individuals. With direct_method, the n individuals of lower cost.
+        """
+        temp = np.mean(self.current_cost, 1) + np.std(self.current_cost, 1)
+        if direct_method:
+            return np.argsort(temp, kind='stable')[:n]
+        if self.selection_method == 'roulette':
+            probability_selection = np.array(temp) / np.sum(temp)
+            ind_selected = np.random.choice(a=np.arange(self.n_individuals),
+                                            size=n,
+                                            p=list(probability_selection),
+                                            replace=True)
+        elif self.selection_method == "rank":
+            ranks = rankdata(1 * np.array(temp))
+            selection_probability = 1 / ranks
+            selection_probability = selection_probability / np.sum(selection_probability)
+            ind_selected = np.random.choice(a=np.arange(self.n_individuals),
+                                            size=n,
+                                            p=list(selection_probability),
+                                            replace=True)
         else:
-            temp = np.mean(self.current_cost, 1) + np.std(self.current_cost, 1)
-            list_order = sorted(temp)
-            value_select = list_order[:n]
-            ind_selected = []
-            for elem in value_select:
-                index_select = np.where(temp == elem)[0][0]
-                ind_selected.append(deepcopy(self.population[int(index_select)]))
+            print('Select method')
+            ind_selected = np.zeros(0, dtype=int)
         return ind_selected
 
+    def get_best_genomes(self, n):
+        # Genes and costs of the n individuals of lower cost of the last evaluated population
+        index = self.ga_selection(n, direct_method=True)
+        return self.genome[index], np.array(self.current_cost)[index]
+
+    def replace_worst_genomes(self, genome, cost):
+        # The individuals of higher cost of the last evaluated population are replaced by the given genes and costs
+        temp = np.mean(self.current_cost, 1) + np.std(self.current_cost, 1)
+        index = np.argsort(temp, kind='stable')[::-1][:len(genome)]
+        self.genome[index] = genome
+        for indv, indv_cost in zip(index, cost):
+            self.current_cost[indv] = list(indv_cost)
+        self.population = self.decode_population()
+        return
+
     def ga_crossover_coding(self, parents_1, parents_2):
-        children_1 = []
-        children_2 = []
-        cut_position = np.random.randint(0, self.n_variables)
-        children_1[:cut_position] = deepcopy(self.population[parents_1][:cut_position])
-        children_1[cut_position:] = deepcopy(self.population[parents_2][cut_position:])
-        children_2[:cut_position] = deepcopy(self.population[parents_2][:cut_position])
-        children_2[cut_position:] = deepcopy(self.population[parents_1][cut_position:])
+        # One point crossover of each pair of parents, cut at the first gene of a random variable
+        cut_position = self.schema.var_start[np.random.randint(0, self.n_variables, size=len(parents_1))]
+        first_part = np.arange(self.schema.n_genes) < cut_position[:, None]
+        children_1 = np.where(first_part, self.genome[parents_1], self.genome[parents_2])
+        children_2 = np.where(first_part, self.genome[parents_2], self.genome[parents_1])
         return children_1, children_2
 
     def ga_crossover_arithmetic(self, parents_1, parents_2):
-        children_1 = []
-        children_2 = []
-        for i in range(self.n_variables):
-            if type(self.population[parents_1][i]) == float:
-                chs1 = self.population[parents_1][i] * self.weight_crossover \
-                       + (1 - self.weight_crossover) * self.population[parents_2][i]
-                chs2 = self.population[parents_2][i] * self.weight_crossover \
-                       + (1 - self.weight_crossover) * self.population[parents_1][i]
-                children_1.append(deepcopy(chs1))
-                children_2.append(deepcopy(chs2))
-            elif type(self.population[parents_1][i]) == str:
-                chs1 = self.population[parents_1][i]
-                chs2 = self.population[parents_2][i]
-                children_1.append(chs1)
-                children_2.append(chs2)
-            elif type(self.population[parents_1][i]) == list:
-                sub_chs1 = []
-                sub_chs2 = []
-                for k in range(len(self.population[parents_1][i])):
-                    sub_chs1.append(self.population[parents_1][i][k] * self.weight_crossover + \
-                                    (1 - self.weight_crossover) * self.population[parents_2][i][k])
-                    sub_chs2.append(self.population[parents_2][i][k] * self.weight_crossover + \
-                                    (1 - self.weight_crossover) * self.population[parents_1][i][k])
-                children_1.append(deepcopy(sub_chs1))
-                children_2.append(deepcopy(sub_chs2))
-            elif type(self.population[parents_1][i]) == int:
-                chs1 = self.population[parents_1][i]
-                chs2 = self.population[parents_2][i]
-                children_1.append(chs1)
-                children_2.append(chs2)
-            else:
-                print('No type found')
+        # Weighted mean of the mutable genes of each pair of parents, the other genes are taken from each parent
+        genome_1, genome_2 = self.genome[parents_1], self.genome[parents_2]
+        mutable = self.schema.mutable
+        children_1 = np.where(mutable, genome_1 * self.weight_crossover + (1 - self.weight_crossover) * genome_2,
+                              genome_1)
+        children_2 = np.where(mutable, genome_2 * self.weight_crossover + (1 - self.weight_crossover) * genome_1,
+                              genome_2)
         return children_1, children_2
 
-    def ga_mutation(self, mut_descent, mutate):
-        if not mutate:
-            return mut_descent
-        else:
-            mutated_probability = []
-            mutated_positions = []
-            vector = []
-            for sublist in self.population[0]:
-                if type(sublist) == list:
-                    mutated_probability.append(np.random.uniform(low=0, high=1, size=len(sublist)))
-                    temp = self.mutation_probability > mutated_probability[-1]
-                    mutated_positions.append(temp)
-                    vector += list(temp)
-                else:
-                    mutated_probability.append(np.random.uniform(low=0, high=1))
-                    temp = self.mutation_probability > mutated_probability[-1]
-                    mutated_positions.append(temp)
-                    vector.append(temp)
-            if np.all(~np.array(vector)):
-                return mut_descent
-            else:
-                for j in range(len(mutated_positions)):
-                    sub_mutated = mutated_positions[j]
-                    if self.range_variables[j][0] == 'float_iter':
-                        for i in range(len(sub_mutated)):
-                            if sub_mutated[i]:
-                                mut_descent[j][i] += 0.3 * mut_descent[j][i] * np.random.normal(0, 0.1)
-                                if mut_descent[j][i] < self.range_variables[j][1]:
-                                    mut_descent[j][i] = self.range_variables[j][1]
-                                elif mut_descent[j][i] > self.range_variables[j][2]:
-                                    mut_descent[j][i] = self.range_variables[j][2]
-                                else:
-                                    mut_descent[j][i] = mut_descent[j][i]
-                    elif self.range_variables[j][0] == 'float':
-                        mut_descent[j] += 0.3 * mut_descent[j] * np.random.normal(0, 0.1)
-                        if mut_descent[j] < self.range_variables[j][1]:
-                            mut_descent[j] = self.range_variables[j][1]
-                        elif mut_descent[j] > self.range_variables[j][2]:
-                            mut_descent[j] = self.range_variables[j][2]
-                        else:
-                            mut_descent[j] = mut_descent[j]
-                    elif self.range_variables[j][0] == 'str':
-                        pass
-                    else:
-                        pass
-        return mut_descent
+    def ga_mutation(self, genome):
+        # Each mutable gene changes with mutation_probability, and it is limited by its range
+        mutated_positions = (np.random.uniform(low=0, high=1, size=np.shape(genome)) < self.mutation_probability) \
+            & self.schema.mutable
+        genome = genome + np.where(mutated_positions, 0.3 * genome * np.random.normal(0, 0.1, size=np.shape(genome)),
+                                   0)
+        return self.schema.clip(genome)
 
     def print_report(self, Hf, Vf, Mf, Tf, individual):
         print(':::::::::::::::::::::::::::::::::::::::::::::::::')
@@ -0,0 +1,93 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 4:30 PM
+els.obrq@gmail.com
+
+"""
+import numpy as np
+
+
+class GenomeSchema(object):
+    """
+    Layout of the individuals of GeneticAlgorithm as rows of a float array (n_individuals, n_genes), built from
+    ranges_variable. Each variable uses the columns 'columns' of the array:
+        'float': one gene in [min, max]
+        'float_iter': one gene by element (range_variable[3] elements) in [min, max]
+        'int': one gene, random in [min, max) or fixed if the range has only one value
+        'str': one gene with the index of the selected option
+    Only the 'float' and 'float_iter' genes are changed by the crossover and the mutation (mutable).
+    """
+    def __init__(self, ranges_variable):
+        self.ranges_variable = ranges_variable
+        self.variables = []
+        n_genes = 0
+        for range_variable in ranges_variable:
+            type_variable = range_variable[0]
+            size = int(range_variable[3]) if type_variable == 'float_iter' else 1
+            variable = {'type': type_variable, 'columns': slice(n_genes, n_genes + size), 'lower': 0.0, 'upper': 0.0}
+            if type_variable in ['float', 'float_iter']:
+                variable['lower'] = min(range_variable[1], range_variable[2])
+                variable['upper'] = max(range_variable[1], range_variable[2])
+            elif type_variable == 'str':
+                variable['options'] = range_variable[1:]
+            elif type_variable != 'int':
+                print('No type found')
+            self.variables.append(variable)
+            n_genes += size
+        self.n_genes = n_genes
+        self.var_start = np.array([variable['columns'].start for variable in self.variables])
+        self.lower = np.zeros(n_genes)
+        self.upper = np.zeros(n_genes)
+        self.mutable = np.zeros(n_genes, dtype=bool)
+        for variable in self.variables:
+            self.lower[variable['columns']] = variable['lower']
+            self.upper[variable['columns']] = variable['upper']
+            self.mutable[variable['columns']] = variable['type'] in ['float', 'float_iter']
+
+    def random_population(self, n_individuals):
+        genome = np.zeros((n_individuals, self.n_genes))
+        for range_variable, variable in zip(self.ranges_variable, self.variables):
+            columns = variable['columns']
+            if variable['type'] == 'float':
+                genome[:, columns] = np.random.uniform(range_variable[1], range_variable[2], size=(n_individuals, 1))
+            elif variable['type'] == 'int':
+                if len(range_variable) == 3:
+                    genome[:, columns] = np.random.randint(range_variable[1], range_variable[2],
+                                                           size=(n_individuals, 1))
+                else:
+                    genome[:, columns] = range_variable[1]
+            elif variable['type'] == 'str':
+                genome[:, columns] = np.random.randint(0, len(variable['options']), size=(n_individuals, 1))
+            elif variable['type'] == 'float_iter':
+                left, right = variable['lower'], variable['upper']
+                genome[:, columns] = np.random.triangular(left, left + (right - left) * 0.7, right,
+                                                          size=(n_individuals, columns.stop - columns.start))
+        return genome
+
+    def decode(self, row):
+        # Individual as the list of variables used by GeneticAlgorithm.set_individual
+        individual = []
+        for variable in self.variables:
+            genes = row[variable['columns']]
+            if variable['type'] == 'float':
+                individual.append(float(genes[0]))
+            elif variable['type'] == 'int':
+                individual.append(int(genes[0]))
+            elif variable['type'] == 'str':
+                individual.append(variable['options'][int(genes[0])])
+            else:
+                individual.append(genes.tolist())
+        return individual
+
+    def encode(self, individual):
+        row = np.zeros(self.n_genes)
+        for value, variable in zip(individual, self.variables):
+            if variable['type'] == 'str':
+                value = variable['options'].index(value)
+            row[variable['columns']] = value
+        return row
+
+    def clip(self, genome):
+        return np.where(self.mutable, np.clip(genome, self.lower, self.upper), genome)
@@ -0,0 +1,115 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 9:30 PM
+els.obrq@gmail.com
+
+"""
+import multiprocessing
+import numpy as np
+from tools.GeneticAlgorithm import GeneticAlgorithm
+
+
+def run_island(island, seed, ga_parameters, optimize_parameters, migration, inbox, outbox, result_queue):
+    """
+    Run the GeneticAlgorithm of an island. Every migration_interval generations, the best n_migrants individuals are
+    sent to the next island and replace the worst individuals of this island with the ones of the previous island.
+    When the island finishes, it sends None to the next island, which does not wait for more migrants after it.
+
+    :param migration: (migration_interval, n_migrants)
+    :param inbox: queue of the migrants of the previous island, or None
+    :param outbox: queue of the migrants to the next island, or None
+    """
+    np.random.seed([seed, island])
+    ga = GeneticAlgorithm(**ga_parameters)
+    migration_interval, n_migrants = migration
+    neighbor_finished = [False]
+
+    def migrate(island_ga, generation):
+        if generation % migration_interval != 0 or outbox is None:
+            return
+        outbox.put(island_ga.get_best_genomes(n_migrants))
+        if neighbor_finished[0]:
+            return
+        migrants = inbox.get()
+        if migrants is None:
+            neighbor_finished[0] = True
+        else:
+            island_ga.replace_worst_genomes(*migrants)
+        return
+
+    ga.migration_function = migrate
+    output = ga.optimize(**optimize_parameters)
+    if outbox is not None:
+        outbox.put(None)
+        # The migrants of the previous island are read until it finishes, so it does not wait for this island to exit
+        while not neighbor_finished[0]:
+            neighbor_finished[0] = inbox.get() is None
+    result = (island, output, ga.historical_cost, ga.historical_best_cost, ga.termination)
+    if result_queue is None:
+        return result
+    result_queue.put(result)
+    return
+
+
+class IslandModel(object):
+    """
+    n_islands populations of GeneticAlgorithm, each one in its own process, with migration of the best individuals in
+    a ring: the island i sends its best n_migrants individuals to the island i + 1 every migration_interval
+    generations. The islands evaluate their populations in sequence (n_workers of GeneticAlgorithm is not used).
+    """
+    def __init__(self, n_islands=4, migration_interval=5, n_migrants=2, seed=None, **ga_parameters):
+        """
+        :param seed: seed of the islands, the island i uses the seed (seed, i). If None, it is drawn from the global
+            random state.
+        :param ga_parameters: parameters of GeneticAlgorithm of each island
+        """
+        self.n_islands = n_islands
+        self.migration_interval = migration_interval
+        self.n_migrants = n_migrants
+        self.seed = seed
+        self.ga_parameters = ga_parameters
+        self.ga_parameters['n_workers'] = None
+        self.historical_cost = []
+        self.historical_best_cost = []
+        self.termination = []
+        self.best_island = None
+
+    def optimize(self, cost_function=None, n_case=1, restriction_function=None, alt_noise=None,
+                 summary_cost_function=None):
+        """
+        Run the islands (see GeneticAlgorithm.optimize). The processes are created with fork, the functions and the
+        dynamics of the arguments are not pickled.
+
+        :return: output of GeneticAlgorithm.optimize of the island with the best individual of lower cost
+        """
+        seed = self.seed
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+        optimize_parameters = {'cost_function': cost_function, 'n_case': n_case,
+                               'restriction_function': restriction_function, 'alt_noise': alt_noise,
+                               'summary_cost_function': summary_cost_function}
+        migration = (self.migration_interval, self.n_migrants)
+        if self.n_islands == 1:
+            results = [run_island(0, seed, self.ga_parameters, optimize_parameters, migration, None, None, None)]
+        else:
+            context = multiprocessing.get_context('fork')
+            queues = [context.Queue() for _ in range(self.n_islands)]
+            result_queue = context.Queue()
+            processes = []
+            for island in range(self.n_islands):
+                processes.append(context.Process(target=run_island,
+                                                 args=(island, seed, self.ga_parameters, optimize_parameters,
+                                                       migration, queues[island - 1], queues[island], result_queue)))
+                processes[-1].start()
+            # The results are read before join, a process does not finish until its queued data is read
+            results = sorted([result_queue.get() for _ in range(self.n_islands)], key=lambda result: result[0])
+            for process in processes:
+                process.join()
+        self.historical_cost = [result[2] for result in results]
+        self.historical_best_cost = [result[3] for result in results]
+        self.termination = [result[4] for result in results]
+        self.best_island = int(np.argmin([result[3][-1] for result in results]))
+        print('Best island: ', self.best_island, ', Cost: ', self.historical_best_cost[self.best_island][-1])
+        return results[self.best_island][1]
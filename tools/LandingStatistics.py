@@ -0,0 +1,118 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 11:55 PM
+els.obrq@gmail.com
+
+"""
+import numpy as np
+from scipy.stats import chi2, norm, t as t_student
+from tools.QuantileSketch import QuantileSketch
+
+# Bins of the histogram of the landing error of altitude [m] and velocity [m/s]
+ALT_ERROR_EDGES = np.linspace(-20, 20, 81)
+VEL_ERROR_EDGES = np.linspace(-20, 20, 81)
+
+
+class LandingStatistics(object):
+    """
+    Statistics of the landing altitude and velocity of the cases, added one by one in constant memory: mean and
+    variance (Welford's algorithm), minimum and maximum, optional quantiles (see QuantileSketch) and histogram of the
+    landing error with respect to the target. The values outside the edges of the histogram are counted in
+    below and above. With a velocity limit, the cases of higher landing speed are counted as failures.
+    """
+    def __init__(self, target=None, quantiles=None, edges=None, velocity_limit=None):
+        """
+        :param target: target altitude and velocity of the landing error, [0, 0] if None
+        :param quantiles: list of the quantiles (0 to 1) to estimate, or None
+        :param edges: edges of the histogram of the altitude and velocity error, or None for ALT_ERROR_EDGES and
+            VEL_ERROR_EDGES
+        :param velocity_limit: maximum landing speed [m/s] of a case without failure, or None
+        """
+        self.target = np.zeros(2) if target is None else np.array(target[:2], dtype=float)
+        self.n_case = 0
+        self.mean = np.zeros(2)
+        self.m2 = np.zeros(2)
+        self.min = np.full(2, np.inf)
+        self.max = np.full(2, -np.inf)
+        self.quantiles = quantiles or []
+        self.sketches = [[QuantileSketch(p) for p in self.quantiles] for _ in range(2)]
+        self.edges = [ALT_ERROR_EDGES, VEL_ERROR_EDGES] if edges is None else [np.array(e, dtype=float) for e in edges]
+        self.histogram = [np.zeros(len(e) - 1, dtype=int) for e in self.edges]
+        self.below = np.zeros(2, dtype=int)
+        self.above = np.zeros(2, dtype=int)
+        self.velocity_limit = velocity_limit
+        self.n_failure = 0
+
+    def add(self, x_land):
+        """
+        :param x_land: landing state of a case (altitude, velocity, ...)
+        """
+        value = np.array(x_land[:2], dtype=float)
+        self.n_case += 1
+        delta = value - self.mean
+        self.mean += delta / self.n_case
+        self.m2 += delta * (value - self.mean)
+        self.min = np.minimum(self.min, value)
+        self.max = np.maximum(self.max, value)
+        if self.velocity_limit is not None and abs(value[1]) > self.velocity_limit:
+            self.n_failure += 1
+        for i in range(2):
+            for sketch in self.sketches[i]:
+                sketch.add(value[i])
+            error = value[i] - self.target[i]
+            index = np.searchsorted(self.edges[i], error, side='right') - 1
+            if index < 0:
+                self.below[i] += 1
+            elif error > self.edges[i][-1]:
+                self.above[i] += 1
+            else:
+                self.histogram[i][min(index, len(self.histogram[i]) - 1)] += 1
+        return
+
+    def get_std(self, ddof=0):
+        if self.n_case <= ddof:
+            return np.full(2, np.nan)
+        return np.sqrt(self.m2 / (self.n_case - ddof))
+
+    def get_confidence_intervals(self, confidence=0.95):
+        """
+        Two-sided confidence intervals of the mean (Student's t) and of the standard deviation (chi-square) of the
+        altitude and velocity.
+
+        :return: arrays (2, 2) of the lower and upper limit of the mean and of the std of altitude and velocity
+        """
+        n = self.n_case
+        if n < 2:
+            infinite = np.array([[-np.inf, np.inf]] * 2)
+            return infinite, infinite
+        alpha = 1 - confidence
+        std = self.get_std(ddof=1)
+        mean_error = t_student.ppf(1 - alpha / 2, n - 1) * std / np.sqrt(n)
+        std_factor = np.sqrt((n - 1) / chi2.ppf([1 - alpha / 2, alpha / 2], n - 1))
+        return np.array([self.mean - mean_error, self.mean + mean_error]).T, std[:, None] * std_factor
+
+    def get_failure_interval(self, confidence=0.95):
+        """
+        :return: failure probability and its Wilson score confidence interval
+        """
+        n = self.n_case
+        if n == 0:
+            return np.nan, np.array([0.0, 1.0])
+        p = self.n_failure / n
+        z = norm.ppf(1 - (1 - confidence) / 2)
+        center = (p + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+        half_width = z / (1 + z ** 2 / n) * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2))
+        return p, np.array([center - half_width, center + half_width])
+
+    def get_quantiles(self):
+        """
+        :return: array (2, n_quantiles) of the quantiles of altitude and velocity
+        """
+        return np.array([[sketch.get_value() for sketch in sketches] for sketches in self.sketches])
+
+    def get_performance(self):
+        # [mean altitude, mean velocity, std altitude, std velocity], as plot_distribution
+        std = self.get_std()
+        return [self.mean[0], self.mean[1], std[0], std[1]]
@@ -5,15 +5,61 @@ email: els.obrq@gmail.com
 
 """
 import numpy as np
+from scipy.stats import norm, qmc
+
+# Samplers of the cases
+RANDOM = 'random'
+SOBOL = 'sobol'
+LHS = 'lhs'
+
+# Distributions of the dimensions
+NORMAL = 'normal'
+UNIFORM = 'uniform'
 
 
 class MonteCarlo(object):
-    def __init__(self, mu, sigma, ndata):
+    def __init__(self, mu, sigma, ndata, method=RANDOM, seed=None, distribution=NORMAL):
+        """
+        :param mu: mean of the normal distribution (lower limit of the uniform distribution), scalar or array of the
+            dimensions that are sampled jointly
+        :param sigma: standard deviation of the normal distribution (width of the uniform distribution)
+        :param method: RANDOM (i.i.d. samples of the global random state), SOBOL (scrambled Sobol sequence) or LHS
+            (Latin hypercube). The samples of SOBOL and LHS are stratified in the unit hypercube of all the dimensions
+            and mapped by the inverse CDF of the distribution of each one.
+        :param seed: seed of the SOBOL and LHS samplers
+        :param distribution: NORMAL or UNIFORM, or list by dimension
+        """
         self.mu = mu
         self.sigma = sigma
         self.ndata = ndata
-        self.random_value()
+        self.method = method
+        self.seed = seed
+        self.distribution = distribution
 
     def random_value(self):
-        data = np.random.normal(self.mu, self.sigma, self.ndata)
-        return data
+        """
+        :return: array (ndata,) of samples, or (ndata, n_dim) if mu is an array
+        """
+        if self.method == RANDOM and np.ndim(self.mu) == 0 and self.distribution == NORMAL:
+            data = np.random.normal(self.mu, self.sigma, self.ndata)
+            return data
+        n_dim = max(np.size(self.mu), np.size(self.sigma))
+        unit = self.random_unit(n_dim)
+        uniform = np.broadcast_to(np.array(self.distribution) == UNIFORM, (n_dim,))
+        # The limits of the unit samples are moved inside (0, 1) for the inverse CDF of the normal distribution
+        unit_normal = np.clip(unit, np.finfo(float).eps, 1 - np.finfo(float).eps)
+        data = np.array(self.mu, dtype=float) + np.array(self.sigma, dtype=float) * np.where(uniform, unit,
+                                                                                            norm.ppf(unit_normal))
+        return data if np.ndim(self.mu) > 0 or np.ndim(self.sigma) > 0 else data[:, 0]
+
+    def random_unit(self, n_dim):
+        # Samples (ndata, n_dim) of the unit hypercube with the method
+        if self.method == SOBOL:
+            # The Sobol sequence is drawn with a power of 2 number of points, to keep its balance properties
+            m = int(np.ceil(np.log2(max(self.ndata, 1))))
+            return qmc.Sobol(n_dim, scramble=True, seed=self.seed).random_base2(m)[:self.ndata]
+        if self.method == LHS:
+            return qmc.LatinHypercube(n_dim, seed=self.seed).random(self.ndata)
+        if self.method != RANDOM:
+            print('Select a correct sampler of the cases')
+        return np.random.uniform(size=(self.ndata, n_dim))
@@ -0,0 +1,66 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 11:40 PM
+els.obrq@gmail.com
+
+"""
+import numpy as np
+
+
+class QuantileSketch(object):
+    """
+    Streaming estimation of the quantile p of a sequence of values with the P-square algorithm (Jain and Chlamtac,
+    1985): five markers whose heights are adjusted with a parabolic prediction as each value is added, in constant
+    memory. With less than five values, the quantile is computed from the values.
+    """
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.height = []
+        self.position = np.arange(5, dtype=float)
+        self.desired_position = np.array([0, 2 * p, 4 * p, 2 + 2 * p, 4])
+        self.increment = np.array([0, p / 2, p, (1 + p) / 2, 1])
+
+    def add(self, value):
+        self.count += 1
+        if self.count <= 5:
+            self.height.append(float(value))
+            if self.count == 5:
+                self.height = np.sort(self.height)
+            return
+        q = self.height
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = int(np.searchsorted(q, value, side='right')) - 1
+        self.position[k + 1:] += 1
+        self.desired_position += self.increment
+        n = self.position
+        for i in range(1, 4):
+            d = self.desired_position[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = np.sign(d)
+                # Parabolic prediction of the marker height, or linear if it is not between the neighbor markers
+                slope_up = (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                slope_down = (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * slope_up
+                                                             + (n[i + 1] - n[i] - d) * slope_down)
+                if not q[i - 1] < height < q[i + 1]:
+                    j = i + int(d)
+                    height = q[i] + d * (q[j] - q[i]) / (n[j] - n[i])
+                q[i] = height
+                n[i] += d
+        return
+
+    def get_value(self):
+        if self.count == 0:
+            return np.nan
+        if self.count < 5:
+            return float(np.quantile(self.height, self.p))
+        return float(self.height[2])
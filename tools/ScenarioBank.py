@@ -0,0 +1,91 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 6:10 PM
+els.obrq@gmail.com
+
+"""
+import numpy as np
+from tools.MonteCarlo import MonteCarlo, RANDOM, NORMAL, UNIFORM
+
+
+class ScenarioBank(object):
+    """
+    Random values of n_case cases, drawn up front as arrays with a numpy.random.Generator and a seed: initial states,
+    and Isp bias [s], ignition dead time [s] and Isp noise [s] of each burn step of each engine, with the
+    uncertainties of the propellants of the engines. All the individuals of a generation replay the same bank
+    (common random numbers), in batch (get_batch_values) or case by case (get_case_values, see
+    Dynamics.set_case_uncertainties). The initial states, Isp bias and dead time can be sampled jointly with a
+    stratified sampler (see MonteCarlo).
+    """
+    def __init__(self, x0, n_case, thrusters, n_step, state_std=None, seed=None, sampler=None):
+        """
+        :param x0: nominal initial state
+        :param thrusters: list of Thruster, to get the uncertainties of the propellants
+        :param n_step: number of Isp noise values by engine. The noise is drawn by step, so the values of the first
+            steps do not depend on n_step. If None, the Isp noise is not in the bank (random draws of the propellants)
+        :param state_std: standard deviation of each component of the initial state, or None
+        :param sampler: SOBOL or LHS to sample jointly the initial state, the Isp bias and the dead time of the engines
+            (see MonteCarlo), or None for i.i.d. samples. The Isp noise is always i.i.d.
+        """
+        rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.n_case = n_case
+        n_engine = len(thrusters)
+        propellants = [thruster.selected_propellant for thruster in thrusters]
+        self.x0 = np.zeros((n_case, len(x0))) + np.array(x0, dtype=float)
+        self.isp_bias = None
+        self.dead_time = np.zeros((n_case, n_engine))
+        if sampler is not None and sampler != RANDOM:
+            self.set_joint_values(x0, propellants, state_std, sampler, seed)
+        else:
+            if state_std is not None:
+                self.x0 += rng.standard_normal((n_case, len(x0))) * np.array(state_std, dtype=float)
+            if propellants[0].std_bias is not None:
+                self.isp_bias = np.array([propellant.isp0 for propellant in propellants]) \
+                    + np.array([propellant.std_bias for propellant in propellants]) \
+                    * rng.standard_normal((n_case, n_engine))
+            if propellants[0].max_dead_time is not None:
+                self.dead_time = np.array([propellant.max_dead_time for propellant in propellants]) \
+                    * rng.uniform(0, 1, size=(n_case, n_engine))
+        self.isp_noise = None
+        if propellants[0].std_noise is not None and n_step is not None:
+            self.isp_noise = np.transpose(rng.standard_normal((n_step, n_case, n_engine)), (1, 2, 0)) \
+                * np.array([propellant.std_noise for propellant in propellants])[:, None]
+
+    def set_joint_values(self, x0, propellants, state_std, sampler, seed):
+        # Initial states, Isp bias and dead time of the cases sampled jointly with the sampler
+        mu, sigma, distribution = [], [], []
+        if state_std is not None:
+            mu += list(x0)
+            sigma += list(state_std)
+            distribution += [NORMAL] * len(x0)
+        if propellants[0].std_bias is not None:
+            mu += [propellant.isp0 for propellant in propellants]
+            sigma += [propellant.std_bias for propellant in propellants]
+            distribution += [NORMAL] * len(propellants)
+        if propellants[0].max_dead_time is not None:
+            mu += [0.0] * len(propellants)
+            sigma += [propellant.max_dead_time for propellant in propellants]
+            distribution += [UNIFORM] * len(propellants)
+        if len(mu) == 0:
+            return
+        values = MonteCarlo(np.array(mu), np.array(sigma), self.n_case, sampler, seed, distribution).random_value()
+        if state_std is not None:
+            self.x0, values = values[:, :len(x0)], values[:, len(x0):]
+        if propellants[0].std_bias is not None:
+            self.isp_bias, values = values[:, :len(propellants)], values[:, len(propellants):]
+        if propellants[0].max_dead_time is not None:
+            self.dead_time = values
+        return
+
+    def get_case_values(self, k):
+        # Isp bias, Isp noise and dead time of the engines for the case k
+        return None if self.isp_bias is None else self.isp_bias[k], \
+            None if self.isp_noise is None else self.isp_noise[k], self.dead_time[k]
+
+    def get_batch_values(self, n_repeat=1):
+        # Isp bias, Isp noise and dead time of the cases for run_simulation_batch, repeated for n_repeat individuals
+        return [None if values is None else np.tile(values, (n_repeat,) + (1,) * (np.ndim(values) - 1))
+                for values in [self.isp_bias, self.isp_noise, self.dead_time]]
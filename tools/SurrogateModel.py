@@ -0,0 +1,58 @@
+"""
+Created by:
+
+@author: Elias Obreque
+@Date: 10/18/2026 10:15 PM
+els.obrq@gmail.com
+
+"""
+import numpy as np
+from scipy.interpolate import RBFInterpolator
+
+
+class SurrogateModel(object):
+    """
+    Radial basis function regression of the cost (mean + std of the cases) of the evaluated genomes, to rank
+    candidate genomes without simulations. The genes are scaled by their ranges and the model is fitted to the
+    logarithm of the cost, which changes in several orders of magnitude (crash penalties). Only the last max_size
+    evaluated genomes are kept.
+    """
+    def __init__(self, lower, upper, max_size=400, smoothing=1.0, kernel='thin_plate_spline'):
+        """
+        :param lower: lower limit of each gene
+        :param upper: upper limit of each gene
+        :param smoothing: smoothing of the RBF, the costs of the same genome are different by the random cases
+        """
+        self.lower = np.array(lower, dtype=float)
+        self.scale = np.array(upper, dtype=float) - self.lower
+        self.scale[self.scale <= 0] = 1.0
+        self.max_size = max_size
+        self.smoothing = smoothing
+        self.kernel = kernel
+        self.genome = np.zeros((0, len(self.lower)))
+        self.log_cost = np.zeros(0)
+        self.model = None
+
+    def add(self, genome, cost):
+        """
+        :param genome: array (n, n_genes) of evaluated genomes
+        :param cost: cost of each genome
+        """
+        self.genome = np.concatenate((self.genome, (np.array(genome, dtype=float) - self.lower) / self.scale))
+        self.log_cost = np.concatenate((self.log_cost, np.log(np.maximum(cost, 1e-12))))
+        self.genome = self.genome[-self.max_size:]
+        self.log_cost = self.log_cost[-self.max_size:]
+        self.model = None
+        return
+
+    def is_ready(self):
+        # The linear polynomial of the RBF needs more points than genes
+        return len(self.log_cost) > len(self.lower) + 1
+
+    def predict(self, genome):
+        """
+        :return: predicted cost of each genome of the array (n, n_genes)
+        """
+        if self.model is None:
+            self.model = RBFInterpolator(self.genome, self.log_cost, kernel=self.kernel, smoothing=self.smoothing)
+        return np.exp(self.model((np.array(genome, dtype=float) - self.lower) / self.scale))
@@ -56,4 +56,32 @@ def save_data(master_data, folder_name, filename):
             fname += "/"
     with codecs.open("./logs/" + folder_name + filename + ".json", 'w') as file:
         json.dump(master_data, file)
-    print("Data saved to file:", filename)
\ No newline at end of file
+    print("Data saved to file:", filename)
+
+
+def save_checkpoint_data(file_name, **data):
+    """
+    Save arrays and the global random state in a .npz file. The file is replaced when the new one is complete.
+
+    :param file_name: path of the .npz file
+    :param data: arrays to save by name
+    """
+    rng_state = np.random.get_state()
+    temp_file = file_name + '.tmp'
+    with open(temp_file, 'wb') as file:
+        np.savez(file, rng_keys=rng_state[1], rng_pos=rng_state[2], rng_gauss=np.array(rng_state[3:], dtype=float),
+                 **data)
+    os.replace(temp_file, file_name)
+
+
+def load_checkpoint_data(file_name):
+    """
+    Load the arrays of save_checkpoint_data and set the global random state.
+
+    :return: dictionary of the arrays by name
+    """
+    data = dict(np.load(file_name, allow_pickle=True))
+    rng_gauss = data.pop('rng_gauss')
+    np.random.set_state(('MT19937', data.pop('rng_keys'), int(data.pop('rng_pos')), int(rng_gauss[0]),
+                         float(rng_gauss[1])))
+    return data